@@ -6,44 +6,51 @@ from voice_flow_shared.models import ResolutionType
 from voice_flow_shared.prompt import generate_instruction
 
 from voice_flow_agent.utils import (
-    update_attempt,
-    create_outcome,
+    add_background_task,
+    queue_attempt_status,
+    finalize_call,
     parse_date,
     parse_amount,
 )
 
 logger = logging.getLogger(__name__)
 
+# Resolution values as the LLM sends them, mapped straight to the enum member
+_RES_MAP = {m.value: m for m in ResolutionType}
+
 
 class VoiceFlowAgent(agents.Agent):
-    def __init__(self, dial_info: dict) -> None:
+    def __init__(
+        self, dial_info: dict, attempt_id: int, job_ctx: agents.JobContext
+    ) -> None:
         personalized_prompt = generate_instruction(dial_info)
         super().__init__(instructions=personalized_prompt)
 
         self.dial_info = dial_info
-        self.attempt_id = int(dial_info["attempt_id"])
+        self.attempt_id = attempt_id
+
+        # Keep the job context and room name so hangup doesn't look them up
+        self._job_ctx = job_ctx
+        self._room_name = job_ctx.room.name
+
+        # Set once the outcome and final status are written together
+        self._resolution_recorded = False
 
     async def hangup(self):
         """Helper function to hang up the call by deleting the room."""
 
-        job_ctx = agents.get_job_context()
-        await job_ctx.api.room.delete_room(
+        await self._job_ctx.api.room.delete_room(
             api.DeleteRoomRequest(
-                room=job_ctx.room.name,
+                room=self._room_name,
             )
         )
 
     @agents.function_tool()
     async def end_call(self, ctx: agents.RunContext):
         """Called when the user wants to end the call and aftering calling any other tools."""
-        # Update attempt status
-        if self.attempt_id:
-            asyncio.create_task(
-                update_attempt(
-                    attempt_id=self.attempt_id,
-                    status="call_ended",
-                )
-            )
+        # Update attempt status, unless store_resolution already did
+        if self.attempt_id and not self._resolution_recorded:
+            queue_attempt_status(self.attempt_id, "call_ended")
 
         if ctx.session.current_speech:
             await ctx.wait_for_playout()
@@ -55,12 +62,7 @@ class VoiceFlowAgent(agents.Agent):
         """Called when the call reaches voicemail. Use this tool AFTER you hear the voicemail greeting."""
         # Update attempt status
         if self.attempt_id:
-            asyncio.create_task(
-                update_attempt(
-                    attempt_id=self.attempt_id,
-                    status="call_ended",
-                )
-            )
+            queue_attempt_status(self.attempt_id, "call_ended")
         await self.hangup()
 
     @agents.function_tool()
@@ -80,22 +82,30 @@ class VoiceFlowAgent(agents.Agent):
             promised_amount: Amount promised to be paid. (optional, for promise_to_pay)
         """
         try:
-            # Convert resolution string to ResolutionType enum
-            resolution = ResolutionType(resolution.lower())
+            # Convert resolution string to ResolutionType enum, only lowercasing
+            # when the value isn't already in the documented form
+            resolution_type = _RES_MAP.get(resolution) or _RES_MAP.get(
+                resolution.lower()
+            )
+            if resolution_type is None:
+                raise ValueError(f"{resolution!r} is not a valid ResolutionType")
 
             # Parse date and amount using utility functions
             parsed_date = parse_date(promised_date)
             parsed_amount = parse_amount(promised_amount)
 
-            # Store the outcome in the database
+            # Store the outcome and end the attempt in the database
             if self.attempt_id:
-                asyncio.create_task(
-                    create_outcome(
-                        self.attempt_id,
-                        resolution,
-                        description,
-                        parsed_amount,
-                        parsed_date,
+                self._resolution_recorded = True
+                add_background_task(
+                    asyncio.create_task(
+                        finalize_call(
+                            self.attempt_id,
+                            resolution_type,
+                            description,
+                            parsed_amount,
+                            parsed_date,
+                        )
                     )
                 )
 
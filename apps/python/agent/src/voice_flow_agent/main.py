@@ -1,8 +1,8 @@
 import os
-import json
 import asyncio
 import logging
 
+import orjson
 from dotenv import load_dotenv
 
 load_dotenv(".env.local")
@@ -12,13 +12,27 @@ from livekit.plugins import google, cartesia, deepgram, noise_cancellation, sile
 from livekit.plugins.turn_detector.english import EnglishModel
 
 from voice_flow_agent.agent import VoiceFlowAgent
-from voice_flow_agent.utils import update_attempt, write_transcript_to_s3
+from voice_flow_agent.utils import (
+    queue_attempt_status,
+    wait_for_pending_writes,
+    write_transcript_to_s3,
+)
 
 
 OUTBOUND_TRUNK_ID = os.getenv("OUTBOUND_TRUNK_ID")
 logger = logging.getLogger(__name__)
 
 
+def prewarm(proc: agents.JobProcess):
+    """Load the VAD and turn detection models once per worker process.
+
+    Args:
+        proc: The job process whose userdata is shared across jobs
+    """
+    proc.userdata["vad"] = silero.VAD.load()
+    proc.userdata["turn_detection"] = EnglishModel()
+
+
 async def entrypoint(ctx: agents.JobContext):
     """Main entrypoint for the Voice Flow Agent.
 
@@ -26,31 +40,27 @@ async def entrypoint(ctx: agents.JobContext):
         ctx: The job context containing room and job information
     """
     room = ctx.room
-    dial_info = json.loads(ctx.job.metadata)
-    attempt_id = int(dial_info.get("attempt_id"))
+    dial_info = orjson.loads(ctx.job.metadata)
+    attempt_id_str = dial_info.get("attempt_id")
 
-    print(dial_info["phone_number"])
-    if not attempt_id:
+    logger.debug(f"Dialing {dial_info['phone_number']}")
+    if not attempt_id_str or not attempt_id_str.isdigit():
         logger.error("No attempt_id found in job metadata")
         return
 
+    # Parse the attempt ID once and share it with the agent
+    attempt_id = int(attempt_id_str)
+
     @room.on("participant_connected")
     def _(_):
-        asyncio.create_task(
-            update_attempt(
-                attempt_id=attempt_id,
-                status="participant_connected",
-            )
-        )
+        queue_attempt_status(attempt_id, "participant_connected")
 
     @room.on("participant_disconnected")
     def _(_):
-        asyncio.create_task(
-            update_attempt(
-                attempt_id=attempt_id,
-                status="call_ended",
-            )
-        )
+        queue_attempt_status(attempt_id, "call_ended")
+
+    # Make sure outcomes and queued status changes reach the database before exiting
+    ctx.add_shutdown_callback(wait_for_pending_writes)
 
     # Recording call requires egress service to be configured locally.
     egress_request = api.RoomCompositeEgressRequest(
@@ -70,18 +80,41 @@ async def entrypoint(ctx: agents.JobContext):
         ],
     )
 
-    await ctx.api.egress.start_room_composite_egress(egress_request)
+    # Build the STT/LLM/TTS plugins in threads while the egress request is in flight
+    _, stt, llm, tts = await asyncio.gather(
+        ctx.api.egress.start_room_composite_egress(egress_request),
+        asyncio.to_thread(deepgram.STT, model="nova-3"),
+        asyncio.to_thread(google.LLM, model="gemini-2.5-flash"),
+        asyncio.to_thread(cartesia.TTS, model="sonic-2"),
+    )
 
     session = agents.AgentSession(
-        stt=deepgram.STT(model="nova-3"),
-        llm=google.LLM(model="gemini-2.5-flash"),
-        tts=cartesia.TTS(model="sonic-2"),
-        vad=silero.VAD.load(),
-        turn_detection=EnglishModel(),
+        stt=stt,
+        llm=llm,
+        tts=tts,
+        vad=ctx.proc.userdata["vad"],
+        turn_detection=ctx.proc.userdata["turn_detection"],
     )
 
+    # Gemini 2.5 caches the repeated system instruction prefix implicitly
+    # across turns, so track usage to see how much of each prompt was cached
+    usage_collector = agents.metrics.UsageCollector()
+
+    @session.on("metrics_collected")
+    def _(ev: agents.MetricsCollectedEvent):
+        usage_collector.collect(ev.metrics)
+
+    async def log_usage():
+        summary = usage_collector.get_summary()
+        logger.info(
+            f"Attempt {attempt_id} used {summary.llm_prompt_tokens} prompt tokens, "
+            f"{summary.llm_prompt_cached_tokens} served from cache"
+        )
+
+    ctx.add_shutdown_callback(log_usage)
+
     # Create debt collection agent with customer information
-    agent = VoiceFlowAgent(dial_info=dial_info)
+    agent = VoiceFlowAgent(dial_info=dial_info, attempt_id=attempt_id, job_ctx=ctx)
 
     # Add shutdown callback to write transcript to S3
     async def write_transcript():
@@ -102,8 +135,10 @@ async def entrypoint(ctx: agents.JobContext):
         )
     )
 
-    try:
-        await ctx.api.sip.create_sip_participant(
+    # Dial as a task so the session warms up while the phone rings; the dial
+    # only completes once the call is answered, and raises if it isn't
+    dial = asyncio.create_task(
+        ctx.api.sip.create_sip_participant(
             api.CreateSIPParticipantRequest(
                 room_name=room.name,
                 sip_trunk_id=OUTBOUND_TRUNK_ID,
@@ -112,15 +147,20 @@ async def entrypoint(ctx: agents.JobContext):
                 wait_until_answered=True,
             )
         )
+    )
 
-        # wait for the agent session start
-        await session_started
+    try:
+        await asyncio.gather(session_started, dial)
     except api.TwirpError as e:
-        print(e)
+        logger.error(f"SIP dial failed for attempt {attempt_id}: {e}")
         ctx.shutdown()
 
 
 if __name__ == "__main__":
     agents.cli.run_app(
-        agents.WorkerOptions(entrypoint_fnc=entrypoint, agent_name="voice-flow-agent")
+        agents.WorkerOptions(
+            entrypoint_fnc=entrypoint,
+            prewarm_fnc=prewarm,
+            agent_name="voice-flow-agent",
+        )
     )
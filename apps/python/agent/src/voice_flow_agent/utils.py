@@ -1,10 +1,15 @@
 import os
-import json
+import re
+import asyncio
 import logging
+from collections import defaultdict
 from datetime import datetime
+from functools import lru_cache
 import boto3
+import orjson
+from botocore.config import Config
 from botocore.exceptions import ClientError
-from sqlalchemy import select
+from sqlalchemy import insert, update
 
 from livekit import agents
 from voice_flow_shared.db import SessionLocal as AsyncSessionLocal
@@ -19,6 +24,38 @@ AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 
 logger = logging.getLogger(__name__)
 
+# MM/DD/YYYY, the one accepted date shape that isn't ISO 8601
+_MDY_RE = re.compile(r"(\d{1,2})/(\d{1,2})/(\d{4})")
+# A leading currency symbol or code, as in "$500", "₹500" or "Rs. 500"
+_AMT_PREFIX_RE = re.compile(r"^(?:\$|₹|rs\.?|inr)\s*", re.IGNORECASE)
+# The number itself, with optional western ("1,234,567") or Indian
+# ("12,34,567") thousands grouping
+_AMT_NUMBER_RE = re.compile(
+    r"(\d{1,3}(?:,\d{3})+|\d{1,2}(?:,\d{2})+,\d{3}|\d+)(?:\.(\d+))?"
+)
+
+# Status updates from every call in the worker are queued and written in
+# batches by a single flusher task
+STATUS_FLUSH_INTERVAL = 0.05
+STATUS_BATCH_SIZE = 100
+_status_queue: asyncio.Queue[tuple[int, str]] = asyncio.Queue()
+_status_flusher: asyncio.Task | None = None
+
+# Global set to track background writes and prevent them from being garbage collected
+background_tasks: set[asyncio.Task] = set()
+
+
+@lru_cache(maxsize=1)
+def _get_s3_client():
+    """Get the cached S3 client, shared by every call in the worker."""
+    return boto3.client(
+        "s3",
+        region_name=AWS_REGION,
+        aws_access_key_id=AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+        config=Config(max_pool_connections=32, retries={"mode": "standard"}),
+    )
+
 
 async def write_transcript_to_s3(
     session: agents.AgentSession, room_name: str, attempt_id: int, contact_id: str
@@ -37,27 +74,20 @@ async def write_transcript_to_s3(
         return
 
     try:
-        # Create S3 client
-        s3_client = boto3.client(
-            "s3",
-            region_name=AWS_REGION,
-            aws_access_key_id=AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-        )
-
         # Generate filename with timestamp
         current_date = datetime.now().strftime("%Y%m%d_%H%M%S")
         s3_key = f"transcripts/transcript_{contact_id}_{attempt_id}_{current_date}.json"
 
         # Convert transcript to JSON
         transcript_data = session.history.to_dict()
-        transcript_json = json.dumps(transcript_data, indent=2)
+        transcript_json = orjson.dumps(transcript_data, option=orjson.OPT_INDENT_2)
 
-        # Upload to S3
-        s3_client.put_object(
+        # Upload to S3 off the event loop
+        await asyncio.to_thread(
+            _get_s3_client().put_object,
             Bucket=f"{AWS_S3_BUCKET}",
             Key=s3_key,
-            Body=transcript_json.encode("utf-8"),
+            Body=transcript_json,
             ContentType="application/json",
             Metadata={
                 "room_name": room_name,
@@ -73,45 +103,99 @@ async def write_transcript_to_s3(
     except ClientError as e:
         logger.error(f"Failed to upload transcript to S3: {e}")
     except Exception as e:
-        print(e)
         logger.error(f"Unexpected error uploading transcript to S3: {e}")
 
 
-async def update_attempt(attempt_id: int, status: str):
-    """Update the status of a call attempt in the database.
+async def update_attempts(statuses: dict[int, str]):
+    """Update the status of several call attempts in one transaction.
 
     Args:
-        attempt_id: The ID of the call attempt to update
-        status: The new status to set
+        statuses: Mapping of call attempt ID to the new status to set
     """
+    # One UPDATE per distinct status rather than one per attempt
+    attempts_by_status = defaultdict(list)
+    for attempt_id, status in statuses.items():
+        attempts_by_status[status].append(attempt_id)
+
     try:
         async with AsyncSessionLocal() as session:
-            # Fetch the call attempt
-            result = await session.execute(
-                select(CallAttempt).where(CallAttempt.attempt_id == attempt_id)
-            )
-            call_attempt = result.scalar_one_or_none()
-
-            if not call_attempt:
-                logger.error(f"Call attempt with ID {attempt_id} not found")
-                return False
+            for status, attempt_ids in attempts_by_status.items():
+                result = await session.execute(
+                    update(CallAttempt)
+                    .where(CallAttempt.attempt_id.in_(attempt_ids))
+                    .values(status=status)
+                )
 
-            # Update the status
-            call_attempt.status = status
+                # The rowcount stands in for an existence check
+                if result.rowcount < len(attempt_ids):
+                    logger.error(f"Some call attempts in {attempt_ids} were not found")
 
             # Commit the changes
             await session.commit()
-            logger.info(f"Updated attempt {attempt_id} status to: {status}")
+            logger.info(f"Updated attempt statuses: {statuses}")
             return True
     except Exception as e:
-        logger.error(f"Error updating call attempt {attempt_id}: {e}")
+        logger.error(f"Error updating call attempts {list(statuses)}: {e}")
         return False
 
 
-async def create_outcome(
-    attempt_id, resolution, description, promise_amount, promise_date
+async def _flush_statuses():
+    """Drain the status queue, writing each batch with a single commit."""
+    while True:
+        attempt_id, status = await _status_queue.get()
+        # Give other events in the burst a chance to arrive
+        await asyncio.sleep(STATUS_FLUSH_INTERVAL)
+
+        # Only the latest status queued for each attempt is written
+        statuses = {attempt_id: status}
+        drained = 1
+        while drained < STATUS_BATCH_SIZE and not _status_queue.empty():
+            attempt_id, status = _status_queue.get_nowait()
+            statuses[attempt_id] = status
+            drained += 1
+
+        await update_attempts(statuses)
+
+        for _ in range(drained):
+            _status_queue.task_done()
+
+
+def queue_attempt_status(attempt_id: int, status: str):
+    """Queue a status change for a call attempt to be written in the next batch.
+
+    Args:
+        attempt_id: The ID of the call attempt to update
+        status: The new status to set
+    """
+    global _status_flusher
+
+    if _status_flusher is None or _status_flusher.done():
+        _status_flusher = asyncio.create_task(_flush_statuses())
+
+    _status_queue.put_nowait((attempt_id, status))
+
+
+def add_background_task(task: asyncio.Task) -> None:
+    """Add a background task and set up cleanup when it's done"""
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+
+async def wait_for_pending_writes():
+    """Wait until every background write and queued status change has finished."""
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await _status_queue.join()
+
+
+async def finalize_call(
+    attempt_id,
+    resolution,
+    description,
+    promise_amount,
+    promise_date,
+    status="call_ended",
 ):
-    """Create an outcome record for a call attempt.
+    """Store the outcome of a call attempt and set its final status together.
 
     Args:
         attempt_id: The ID of the call attempt
@@ -119,21 +203,30 @@ async def create_outcome(
         description: Description of the resolution
         promise_amount: Promised payment amount (if applicable)
         promise_date: Promised payment date (if applicable)
+        status: The final status to set on the call attempt
     """
     try:
-        async with AsyncSessionLocal() as session:
-            outcome = Outcome(
-                attempt_id=attempt_id,
-                resolution=resolution,
-                description=description,
-                promise_amount=promise_amount,
-                promise_date=promise_date,
+        # One transaction covers both the outcome and the status change
+        async with AsyncSessionLocal() as session, session.begin():
+            # Core INSERT skips the ORM unit of work for a row nobody reads back
+            await session.execute(
+                insert(Outcome).values(
+                    attempt_id=attempt_id,
+                    resolution=resolution,
+                    description=description,
+                    promise_amount=promise_amount,
+                    promise_date=promise_date,
+                )
             )
-            session.add(outcome)
-            await session.commit()
-            logger.info(f"Stored outcome for attempt {attempt_id}: {resolution}")
+            await session.execute(
+                update(CallAttempt)
+                .where(CallAttempt.attempt_id == attempt_id)
+                .values(status=status)
+            )
+        logger.info(f"Stored outcome for attempt {attempt_id}: {resolution}")
+        return True
     except Exception as e:
-        logger.error(f"Error updating call attempt {attempt_id}: {e}")
+        logger.error(f"Error finalizing call attempt {attempt_id}: {e}")
         return False
 
 
@@ -149,16 +242,46 @@ def parse_date(date_string: str) -> datetime:
     if not date_string:
         return None
 
+    # ISO dates take the C-level fast path
     try:
-        # Try different date formats
-        return datetime.strptime(date_string, "%Y-%m-%d")
+        return datetime.fromisoformat(date_string)
     except ValueError:
+        pass
+
+    # MM/DD/YYYY without going through strptime's format parsing
+    match = _MDY_RE.fullmatch(date_string)
+    if match:
+        month, day, year = match.groups()
         try:
-            return datetime.strptime(date_string, "%m/%d/%Y")
+            return datetime(int(year), int(month), int(day))
         except ValueError:
             logger.warning(f"Could not parse date: {date_string}")
             return None
 
+    # Fall back to strptime for unpadded ISO-like dates, e.g. 2024-5-6
+    try:
+        return datetime.strptime(date_string, "%Y-%m-%d")
+    except ValueError:
+        logger.warning(f"Could not parse date: {date_string}")
+        return None
+
+
+def _parse_cents(amount_string: str) -> int:
+    """Convert an amount string to paise using integer arithmetic only."""
+    # Only a known currency prefix and surrounding whitespace are dropped, so
+    # signs, stray dots or foreign separators make the amount invalid instead
+    # of silently changing its value
+    amount_str = _AMT_PREFIX_RE.sub("", amount_string.strip(), count=1).strip()
+    match = _AMT_NUMBER_RE.fullmatch(amount_str)
+    if not match:
+        raise ValueError(f"No amount in {amount_string!r}")
+
+    whole, frac = match.group(1).replace(",", ""), match.group(2) or ""
+    # Paise have two digits, so more would have to be rounded away silently
+    if len(frac) > 2:
+        raise ValueError(f"Invalid amount {amount_string!r}")
+    return int(whole) * 100 + int(frac.ljust(2, "0"))
+
 
 def parse_amount(amount_string: str) -> int:
     """Parse an amount string and convert to paise (integer cents).
@@ -173,9 +296,7 @@ def parse_amount(amount_string: str) -> int:
         return None
 
     try:
-        # Remove dollar signs and convert to paise
-        amount_str = amount_string.replace("$", "").replace(",", "")
-        return int(float(amount_str) * 100)  # Convert to paise
+        return _parse_cents(amount_string)
     except ValueError:
         logger.warning(f"Could not parse amount: {amount_string}")
         return None
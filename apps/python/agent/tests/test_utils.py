@@ -0,0 +1,42 @@
+import pytest
+
+from voice_flow_agent.utils import parse_amount
+
+
+@pytest.mark.parametrize(
+    "amount, expected",
+    [
+        ("500", 50000),
+        ("$123.45", 12345),
+        ("$1,234.5", 123450),
+        ("Rs. 500", 50000),
+        ("rs 500", 50000),
+        ("₹12,34,567.89", 123456789),
+        ("INR 99", 9900),
+        ("12.3", 1230),
+    ],
+)
+def test_parse_amount_valid(amount, expected):
+    assert parse_amount(amount) == expected
+
+
+@pytest.mark.parametrize(
+    "amount",
+    [
+        "-50",
+        ".500",
+        ".5",
+        "1.500,00",
+        "1.2.3",
+        "12.345",
+        "12.3456",
+        "12.",
+        "1,00",
+        "abc",
+        "500 rupees",
+        "$",
+        "",
+    ],
+)
+def test_parse_amount_invalid(amount):
+    assert parse_amount(amount) is None
@@ -1,13 +1,44 @@
+from contextlib import asynccontextmanager
+
 from dotenv import load_dotenv
 
 load_dotenv(".env.local")
+import aiohttp
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from livekit import api
 from voice_flow_shared.db import init_db
+from voice_flow_shared.models import upgrade_schema
 
 from .routers import calls, contacts, health
 
-app = FastAPI(title="Voice Flow API", version="0.1.0", on_startup=[init_db])
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_db()
+    await upgrade_schema()
+
+    # Share one pooled HTTP session for every LiveKit API call, so dispatches
+    # reuse keep-alive connections instead of handshaking each time
+    session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=100, keepalive_timeout=30),
+        timeout=aiohttp.ClientTimeout(total=60),
+    )
+    app.state.lkapi = api.LiveKitAPI(session=session)
+
+    yield
+
+    await app.state.lkapi.aclose()
+    await session.close()
+
+
+app = FastAPI(
+    title="Voice Flow API",
+    version="0.1.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 # Configure CORS
 app.add_middleware(
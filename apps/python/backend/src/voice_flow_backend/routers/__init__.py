@@ -0,0 +1,2 @@
+# Largest page a listing endpoint will return, keeping responses bounded
+MAX_PAGE_SIZE = 500
@@ -1,25 +1,31 @@
-import json
+import os
 import asyncio
 import logging
 from datetime import datetime
+from time import time_ns
 from typing import List, Optional, Dict, Any, Set
-from weakref import WeakSet
 
-from fastapi import APIRouter, HTTPException, Depends
+import orjson
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
 from pydantic import BaseModel
-from sqlalchemy import select, delete
+from sqlalchemy import select, delete, insert, update, case
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
 from livekit import api
 from voice_flow_shared.db import get_db, SessionLocal
-from voice_flow_shared.models import Contact, CallAttempt, Outcome, Debt
+from voice_flow_shared.models import Contact, CallAttempt, Debt
+
+from . import MAX_PAGE_SIZE
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
-lkapi = api.LiveKitAPI()
+
+# Upper bound on LiveKit dispatch requests in flight for one /initiate call
+MAX_CONCURRENT_DISPATCHES = int(os.getenv("MAX_CONCURRENT_DISPATCHES", "16"))
 
 # Global set to track background tasks and prevent them from being garbage collected
-background_tasks: Set[asyncio.Task] = WeakSet()
+background_tasks: Set[asyncio.Task] = set()
 
 
 def add_background_task(task: asyncio.Task) -> None:
@@ -91,31 +97,57 @@ class CallAttemptDelete(BaseModel):
 
 
 # Helper function to store dispatch results
-async def store_dispatch_result(attempt_id: int, dispatch_result: Dict[str, Any]):
-    """Store the dispatch result in the database"""
+async def store_dispatch_results(dispatch_results: List[Dict[str, Any]]):
+    """Store a batch of dispatch results in the database with a single UPDATE"""
+    attempt_ids = [result["attempt_id"] for result in dispatch_results]
+    statuses = {
+        result["attempt_id"]: "dispatched" if "room_name" in result else "failed"
+        for result in dispatch_results
+    }
+    room_names = {
+        result["attempt_id"]: result["room_name"]
+        for result in dispatch_results
+        if "room_name" in result
+    }
+
     async with SessionLocal() as session:
         try:
-            # Update the call attempt with dispatch information
-            result = await session.execute(
-                select(CallAttempt).where(CallAttempt.attempt_id == attempt_id)
-            )
-            call_attempt = result.scalar_one_or_none()
+            # Set each attempt's status and room name by attempt ID within the
+            # same statement, leaving alone attempts the agent has already
+            # moved past "created"
+            values = {"status": case(statuses, value=CallAttempt.attempt_id)}
+            if room_names:
+                values["lk_room_name"] = case(
+                    room_names,
+                    value=CallAttempt.attempt_id,
+                    else_=CallAttempt.lk_room_name,
+                )
 
-            if call_attempt:
-                call_attempt.status = "dispatched"
-                if "room_name" in dispatch_result:
-                    call_attempt.lk_room_name = dispatch_result["room_name"]
+            await session.execute(
+                update(CallAttempt)
+                .where(
+                    CallAttempt.attempt_id.in_(attempt_ids),
+                    CallAttempt.status == "created",
+                )
+                .values(**values)
+            )
 
-                await session.commit()
-                logger.info(f"Attempt {attempt_id} has beed dispatched")
+            await session.commit()
+            logger.info(f"Stored dispatch results for attempts {attempt_ids}")
         except Exception as e:
-            logger.error(f"Error storing dispatch result for attempt {attempt_id}: {e}")
+            logger.error(
+                f"Error storing dispatch results for attempts {attempt_ids}: {e}"
+            )
             await session.rollback()
 
 
 # Helper function for async dispatch
 async def dispatch_call_async(
-    contact: Contact, attempt_id: int = None, debt: Debt = None
+    lkapi: api.LiveKitAPI,
+    contact: Contact,
+    attempt_id: int = None,
+    debt: Debt = None,
+    ts: int = None,
 ):
     """Dispatch a single call asynchronously with debt details"""
     try:
@@ -141,8 +173,8 @@ async def dispatch_call_async(
 
         dispatch_config = {
             "agent_name": "voice-flow-agent",
-            "room": f"call_{contact.contact_id}_{attempt_id}_{int(datetime.now().timestamp())}",
-            "metadata": json.dumps(metadata),
+            "room": f"call_{contact.contact_id}_{attempt_id}_{ts or time_ns() // 1_000_000}",
+            "metadata": orjson.dumps(metadata).decode(),
         }
 
         # Create dispatch using LiveKit agent dispatch
@@ -150,7 +182,6 @@ async def dispatch_call_async(
             api.CreateAgentDispatchRequest(**dispatch_config)
         )
 
-        # Store the result
         result = {
             "contact_id": contact.contact_id,
             "attempt_id": attempt_id,
@@ -158,31 +189,45 @@ async def dispatch_call_async(
             "room_name": dispatch_config["room"],
         }
 
-        # Store in background with proper task tracking
-        store_task = asyncio.create_task(store_dispatch_result(attempt_id, result))
-        add_background_task(store_task)
-
         logger.info(f"Successfully dispatched call for contact {contact.contact_id}")
         return result
     except Exception as e:
         logger.error(f"Failed to dispatch call for contact {contact.contact_id}: {e}")
-        error_result = {
+        return {
             "contact_id": contact.contact_id,
             "attempt_id": attempt_id,
             "error": str(e),
         }
 
-        # Store error in background with proper task tracking
-        store_task = asyncio.create_task(
-            store_dispatch_result(attempt_id, error_result)
+
+def build_call_attempt_response(attempt: CallAttempt) -> CallAttemptDetailResponse:
+    """Build a call attempt response from an attempt with its contact and outcome loaded"""
+    outcome = attempt.outcome
+    if outcome:
+        outcome = OutcomeResponse(
+            attempt_id=outcome.attempt_id,
+            resolution=outcome.resolution,
+            description=outcome.description,
+            promise_amount=outcome.promise_amount,
+            promise_date=outcome.promise_date,
         )
-        add_background_task(store_task)
-        return error_result
+
+    return CallAttemptDetailResponse(
+        attempt_id=attempt.attempt_id,
+        contact_id=attempt.contact_id,
+        started_at=attempt.started_at,
+        status=attempt.status,
+        lk_room_name=attempt.lk_room_name,
+        full_name=attempt.contact.full_name,
+        phone_number=attempt.contact.phone_number,
+        outcome=outcome,
+    )
 
 
 @router.post("/initiate", response_model=CallInitiateResponse)
 async def initiate_calls(
     call_data: CallInitiate,
+    request: Request,
     db: AsyncSession = Depends(get_db),
 ):
     """Initiate calls to single or multiple contacts asynchronously"""
@@ -198,52 +243,85 @@ async def initiate_calls(
         # Create list of (contact, debt) tuples
         contacts_with_debts = [(contact, debt) for contact, debt in contact_debt_pairs]
 
-        # Create call attempts for each contact
+        # One timestamp for the whole batch, used for both the attempts and
+        # their room names
+        now = datetime.now()
+        ts = int(now.timestamp() * 1000)
+
         call_attempts = []
-        for contact, debt in contacts_with_debts:
-            attempt = CallAttempt(
-                contact_id=contact.contact_id,
-                started_at=datetime.now(),
-                status="created",
+        if contacts_with_debts:
+            # Create call attempts for each contact, getting the IDs back in
+            # the same round-trip
+            attempt_ids = await db.scalars(
+                insert(CallAttempt).returning(
+                    CallAttempt.attempt_id, sort_by_parameter_order=True
+                ),
+                [
+                    {
+                        "contact_id": contact.contact_id,
+                        "started_at": now,
+                        "status": "created",
+                    }
+                    for contact, _ in contacts_with_debts
+                ],
             )
-            db.add(attempt)
-            call_attempts.append((contact, attempt, debt))
+            call_attempts = [
+                (contact, attempt_id, debt)
+                for (contact, debt), attempt_id in zip(contacts_with_debts, attempt_ids)
+            ]
 
         await db.commit()
 
-        # Refresh to get IDs
-        for _, attempt, _ in call_attempts:
-            await db.refresh(attempt)
+        # Bound how many LiveKit requests a large batch has in flight at once
+        dispatch_slots = asyncio.Semaphore(MAX_CONCURRENT_DISPATCHES)
+
+        async def guarded_dispatch(contact, attempt_id, debt):
+            async with dispatch_slots:
+                return await dispatch_call_async(
+                    request.app.state.lkapi, contact, attempt_id, debt, ts=ts
+                )
+
+        results = await asyncio.gather(
+            *(
+                guarded_dispatch(contact, attempt_id, debt)
+                for contact, attempt_id, debt in call_attempts
+            ),
+            return_exceptions=True,
+        )
+
+        # Store every dispatch result in background with one statement
+        dispatch_results = [result for result in results if isinstance(result, dict)]
+        if dispatch_results:
+            store_task = asyncio.create_task(store_dispatch_results(dispatch_results))
+            add_background_task(store_task)
 
-        # Dispatch calls asynchronously with proper task tracking
         call_responses = []
-        for contact, attempt, debt in call_attempts:
-            # Create the task with proper tracking to prevent garbage collection
-            dispatch_task = asyncio.create_task(
-                dispatch_call_async(contact, attempt.attempt_id, debt)
-            )
-            add_background_task(dispatch_task)
+        for (contact, attempt_id, _), result in zip(call_attempts, results):
+            if isinstance(result, Exception):
+                error = str(result)
+            else:
+                error = result.get("error")
 
-            # Create response for the initiated call
             call_responses.append(
                 CallResponse(
                     contact_id=contact.contact_id,
-                    attempt_id=attempt.attempt_id,
-                    status="initiated",  # Status is 'initiated' since we just dispatched
+                    attempt_id=attempt_id,
+                    status="failed" if error else "dispatched",
+                    error=error,
                 )
             )
 
+        failed_dispatches = sum(1 for call in call_responses if call.error)
+
         logger.info(
-            f"Initiated calls for {len(contacts_with_debts)} contacts. All dispatches have been started."
+            f"Initiated calls for {len(contacts_with_debts)} contacts, {failed_dispatches} dispatches failed."
         )
 
         return CallInitiateResponse(
             initiated_calls=call_responses,
             total_contacts=len(contacts_with_debts),
-            successful_dispatches=len(
-                contacts_with_debts
-            ),  # All were successfully initiated
-            failed_dispatches=0,  # We don't know about failures yet since we're not waiting
+            successful_dispatches=len(call_responses) - failed_dispatches,
+            failed_dispatches=failed_dispatches,
         )
     except HTTPException:
         raise
@@ -259,28 +337,22 @@ async def delete_call_attempts(
 ):
     """Delete single or multiple call attempts"""
     try:
-        # Check if attempts exist
+        # The returned IDs tell us which attempts actually existed (this will
+        # cascade to outcomes due to foreign key constraints)
         result = await db.execute(
-            select(CallAttempt).where(
-                CallAttempt.attempt_id.in_(attempt_delete.attempt_ids)
-            )
+            delete(CallAttempt)
+            .where(CallAttempt.attempt_id.in_(attempt_delete.attempt_ids))
+            .returning(CallAttempt.attempt_id)
         )
-        existing_attempts = result.scalars().all()
-        existing_ids = {a.attempt_id for a in existing_attempts}
-        missing_ids = set(attempt_delete.attempt_ids) - existing_ids
+        deleted_ids = set(result.scalars().all())
+        missing_ids = set(attempt_delete.attempt_ids) - deleted_ids
 
         if missing_ids:
+            await db.rollback()
             raise HTTPException(
                 status_code=404, detail=f"Call attempts not found: {list(missing_ids)}"
             )
 
-        # Delete the attempts (this will cascade to outcomes due to foreign key constraints)
-        await db.execute(
-            delete(CallAttempt).where(
-                CallAttempt.attempt_id.in_(attempt_delete.attempt_ids)
-            )
-        )
-
         await db.commit()
 
         logger.info(f"Deleted {len(attempt_delete.attempt_ids)} call attempts")
@@ -301,46 +373,21 @@ async def delete_call_attempts(
 async def get_call_attempt(attempt_id: int, db: AsyncSession = Depends(get_db)):
     """Get details of a specific call attempt with associated outcome and contact information"""
     try:
-        # Get call attempt with contact information
+        # Get call attempt with its contact and outcome in one query
         result = await db.execute(
-            select(CallAttempt, Contact)
-            .join(Contact, CallAttempt.contact_id == Contact.contact_id)
+            select(CallAttempt)
+            .options(
+                joinedload(CallAttempt.contact, innerjoin=True),
+                joinedload(CallAttempt.outcome),
+            )
             .where(CallAttempt.attempt_id == attempt_id)
         )
-        attempt_contact = result.first()
+        attempt = result.scalar_one_or_none()
 
-        if not attempt_contact:
+        if not attempt:
             raise HTTPException(status_code=404, detail="Call attempt not found")
 
-        attempt, contact = attempt_contact
-
-        # Get associated outcome if exists
-        outcome_result = await db.execute(
-            select(Outcome).where(Outcome.attempt_id == attempt_id)
-        )
-        outcome = outcome_result.scalar_one_or_none()
-
-        # Prepare response
-        response_data = {
-            "attempt_id": attempt.attempt_id,
-            "contact_id": attempt.contact_id,
-            "started_at": attempt.started_at,
-            "status": attempt.status,
-            "lk_room_name": attempt.lk_room_name,
-            "full_name": contact.full_name,
-            "phone_number": contact.phone_number,
-        }
-
-        if outcome:
-            response_data["outcome"] = {
-                "attempt_id": outcome.attempt_id,
-                "resolution": outcome.resolution.value,  # Convert enum to string
-                "description": outcome.description,
-                "promise_amount": outcome.promise_amount,
-                "promise_date": outcome.promise_date,
-            }
-
-        return CallAttemptDetailResponse(**response_data)
+        return build_call_attempt_response(attempt)
 
     except HTTPException:
         raise
@@ -354,14 +401,15 @@ async def list_call_attempts(
     contact_id: Optional[int] = None,
     status: Optional[str] = None,
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, le=MAX_PAGE_SIZE),
     db: AsyncSession = Depends(get_db),
 ):
     """List call attempts with optional filtering, associated outcomes, and contact information"""
     try:
-        # Build query to join CallAttempt with Contact
-        query = select(CallAttempt, Contact).join(
-            Contact, CallAttempt.contact_id == Contact.contact_id
+        # Join each attempt's contact and load all outcomes in one more query
+        query = select(CallAttempt).options(
+            joinedload(CallAttempt.contact, innerjoin=True),
+            selectinload(CallAttempt.outcome),
         )
 
         if contact_id:
@@ -372,44 +420,9 @@ async def list_call_attempts(
         query = query.offset(skip).limit(limit)
 
         result = await db.execute(query)
-        attempt_contact_pairs = result.all()
-
-        # Get outcomes for all attempts
-        attempt_ids = [attempt.attempt_id for attempt, _ in attempt_contact_pairs]
-        outcome_result = await db.execute(
-            select(Outcome).where(Outcome.attempt_id.in_(attempt_ids))
-        )
-        outcomes = outcome_result.scalars().all()
-
-        # Create a mapping of attempt_id to outcome
-        outcome_map = {outcome.attempt_id: outcome for outcome in outcomes}
-
-        # Prepare response list
-        response_list = []
-        for attempt, contact in attempt_contact_pairs:
-            response_data = {
-                "attempt_id": attempt.attempt_id,
-                "contact_id": attempt.contact_id,
-                "started_at": attempt.started_at,
-                "status": attempt.status,
-                "lk_room_name": attempt.lk_room_name,
-                "full_name": contact.full_name,
-                "phone_number": contact.phone_number,
-            }
-
-            outcome = outcome_map.get(attempt.attempt_id)
-            if outcome:
-                response_data["outcome"] = {
-                    "attempt_id": outcome.attempt_id,
-                    "resolution": outcome.resolution.value,  # Convert enum to string
-                    "description": outcome.description,
-                    "promise_amount": outcome.promise_amount,
-                    "promise_date": outcome.promise_date,
-                }
-
-            response_list.append(CallAttemptDetailResponse(**response_data))
+        attempts = result.scalars().all()
 
-        return response_list
+        return [build_call_attempt_response(attempt) for attempt in attempts]
 
     except Exception as e:
         logger.error(f"Error listing call attempts: {e}")
@@ -2,13 +2,18 @@ import logging
 from typing import List, Optional
 from datetime import datetime
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
 from pydantic import BaseModel
 from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 
 from voice_flow_shared.db import get_db
-from voice_flow_shared.models import Contact, Debt, CallAttempt
+from voice_flow_shared.models import Contact, Debt
+
+from . import MAX_PAGE_SIZE
 
 logger = logging.getLogger(__name__)
 
@@ -83,31 +88,26 @@ async def create_contact(
 ):
     """Create a single contact with optional debt details"""
     try:
-        # Check if phone number already exists
-        existing = await db.execute(
-            select(Contact).where(
-                Contact.phone_number
-                == (contact_data.country_code + contact_data.phone_number)
+        # Create the contact, relying on the unique phone number to detect
+        # duplicates atomically instead of checking first
+        new_contact = await db.scalar(
+            insert(Contact)
+            .values(
+                full_name=contact_data.full_name,
+                phone_number=(contact_data.country_code or "")
+                + contact_data.phone_number,
+                language=contact_data.language,
             )
+            .on_conflict_do_nothing(index_elements=[Contact.phone_number])
+            .returning(Contact)
         )
-        if existing.scalar_one_or_none():
+        if new_contact is None:
             raise HTTPException(
                 status_code=400,
                 detail=f"Contact with phone number {contact_data.phone_number} already exists",
             )
 
-        # Create the contact
-        new_contact = Contact(
-            full_name=contact_data.full_name,
-            phone_number=contact_data.country_code + contact_data.phone_number,
-            language=contact_data.language,
-        )
-
-        db.add(new_contact)
-        await db.commit()
-        await db.refresh(new_contact)
-
-        # Create debt if provided
+        # Create debt if provided, in the same transaction as the contact
         new_debt = None
         if contact_data.debt:
             new_debt = Debt(
@@ -117,31 +117,20 @@ async def create_contact(
                 status=contact_data.debt.status,
             )
             db.add(new_debt)
-            await db.commit()
-            await db.refresh(new_debt)
+            await db.flush()
+
+        await db.commit()
 
         logger.info(
             f"Created contact {new_contact.contact_id} for {new_contact.phone_number}"
             + (f" with debt {new_debt.debt_id}" if new_debt else "")
         )
 
-        # Prepare response
-        response_data = {
-            "contact_id": new_contact.contact_id,
-            "full_name": new_contact.full_name,
-            "phone_number": new_contact.phone_number,
-            "language": new_contact.language,
-        }
+        # The debt is already known, so mark it loaded rather than letting
+        # the response lazy-load it
+        set_committed_value(new_contact, "debt", new_debt)
 
-        if new_debt:
-            response_data["debt"] = {
-                "debt_id": new_debt.debt_id,
-                "amount_due": new_debt.amount_due,
-                "due_date": new_debt.due_date,
-                "status": new_debt.status,
-            }
-
-        return ContactResponse(**response_data)
+        return ContactResponse.model_validate(new_contact)
 
     except HTTPException:
         raise
@@ -157,22 +146,21 @@ async def delete_contacts(
 ):
     """Delete single or multiple contacts"""
     try:
+        # The returned IDs tell us which contacts actually existed
         result = await db.execute(
-            select(Contact).where(Contact.contact_id.in_(contact_delete.contact_ids))
+            delete(Contact)
+            .where(Contact.contact_id.in_(contact_delete.contact_ids))
+            .returning(Contact.contact_id)
         )
-        existing_contacts = result.scalars().all()
-        existing_ids = {c.contact_id for c in existing_contacts}
-        missing_ids = set(contact_delete.contact_ids) - existing_ids
+        deleted_ids = set(result.scalars().all())
+        missing_ids = set(contact_delete.contact_ids) - deleted_ids
 
         if missing_ids:
+            await db.rollback()
             raise HTTPException(
                 status_code=404, detail=f"Contacts not found: {list(missing_ids)}"
             )
 
-        await db.execute(
-            delete(Contact).where(Contact.contact_id.in_(contact_delete.contact_ids))
-        )
-
         await db.commit()
 
         logger.info(f"Deleted {len(contact_delete.contact_ids)} contacts")
@@ -191,18 +179,23 @@ async def delete_contacts(
 
 @router.get("/search", response_model=List[ContactResponse])
 async def search_contacts(
-    q: str, skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)
+    q: str,
+    skip: int = 0,
+    limit: int = Query(100, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db),
 ):
     """Search contacts by name or phone number (partial matching)"""
     try:
-        from sqlalchemy import or_, func
+        from sqlalchemy import or_
 
-        # Build search query with partial matching for both name and phone number
+        # Build search query with partial matching for both name and phone
+        # number, both served by the trigram indexes on contacts
         search_query = (
             select(Contact)
+            .options(selectinload(Contact.debt))
             .where(
                 or_(
-                    func.lower(Contact.full_name).contains(func.lower(q)),
+                    Contact.full_name.ilike(f"%{q}%"),
                     Contact.phone_number.contains(q),
                 )
             )
@@ -213,38 +206,7 @@ async def search_contacts(
         contact_result = await db.execute(search_query)
         contacts = contact_result.scalars().all()
 
-        # Get debts for all found contacts
-        contact_ids = [contact.contact_id for contact in contacts]
-        debt_result = await db.execute(
-            select(Debt).where(Debt.contact_id.in_(contact_ids))
-        )
-        debts = debt_result.scalars().all()
-
-        # Create a mapping of contact_id to debt
-        debt_map = {debt.contact_id: debt for debt in debts}
-
-        # Prepare response list
-        response_list = []
-        for contact in contacts:
-            response_data = {
-                "contact_id": contact.contact_id,
-                "full_name": contact.full_name,
-                "phone_number": contact.phone_number,
-                "language": contact.language,
-            }
-
-            debt = debt_map.get(contact.contact_id)
-            if debt:
-                response_data["debt"] = {
-                    "debt_id": debt.debt_id,
-                    "amount_due": debt.amount_due,
-                    "due_date": debt.due_date,
-                    "status": debt.status,
-                }
-
-            response_list.append(ContactResponse(**response_data))
-
-        return response_list
+        return [ContactResponse.model_validate(contact) for contact in contacts]
 
     except Exception as e:
         logger.error(f"Error searching contacts with query '{q}': {e}")
@@ -253,46 +215,22 @@ async def search_contacts(
 
 @router.get("/", response_model=List[ContactResponse])
 async def list_contacts(
-    skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)
+    skip: int = 0,
+    limit: int = Query(100, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db),
 ):
     """List all contacts with pagination and debt information"""
     try:
-        # Get contacts
-        contact_result = await db.execute(select(Contact).offset(skip).limit(limit))
+        # Get contacts along with their debts
+        contact_result = await db.execute(
+            select(Contact)
+            .options(selectinload(Contact.debt))
+            .offset(skip)
+            .limit(limit)
+        )
         contacts = contact_result.scalars().all()
 
-        # Get debts for all contacts
-        contact_ids = [contact.contact_id for contact in contacts]
-        debt_result = await db.execute(
-            select(Debt).where(Debt.contact_id.in_(contact_ids))
-        )
-        debts = debt_result.scalars().all()
-
-        # Create a mapping of contact_id to debt
-        debt_map = {debt.contact_id: debt for debt in debts}
-
-        # Prepare response list
-        response_list = []
-        for contact in contacts:
-            response_data = {
-                "contact_id": contact.contact_id,
-                "full_name": contact.full_name,
-                "phone_number": contact.phone_number,
-                "language": contact.language,
-            }
-
-            debt = debt_map.get(contact.contact_id)
-            if debt:
-                response_data["debt"] = {
-                    "debt_id": debt.debt_id,
-                    "amount_due": debt.amount_due,
-                    "due_date": debt.due_date,
-                    "status": debt.status,
-                }
-
-            response_list.append(ContactResponse(**response_data))
-
-        return response_list
+        return [ContactResponse.model_validate(contact) for contact in contacts]
 
     except Exception as e:
         logger.error(f"Error listing contacts: {e}")
@@ -303,56 +241,25 @@ async def list_contacts(
 async def get_contact(contact_id: int, db: AsyncSession = Depends(get_db)):
     """Get a single contact by ID with debt information and all call attempts"""
     try:
-        # Get contact
+        # Get contact along with its debt and call attempts, newest first, in
+        # a single round-trip
         contact_result = await db.execute(
-            select(Contact).where(Contact.contact_id == contact_id)
+            select(Contact)
+            .options(
+                joinedload(Contact.debt),
+                joinedload(Contact.call_attempts),
+            )
+            .where(Contact.contact_id == contact_id)
         )
-        contact = contact_result.scalar_one_or_none()
+        contact = contact_result.unique().scalar_one_or_none()
 
         if not contact:
             raise HTTPException(status_code=404, detail="Contact not found")
 
-        # Get associated debt if exists
-        debt_result = await db.execute(
-            select(Debt).where(Debt.contact_id == contact_id)
-        )
-        debt = debt_result.scalar_one_or_none()
-
-        # Get all call attempts for this contact
-        call_attempts_result = await db.execute(
-            select(CallAttempt)
-            .where(CallAttempt.contact_id == contact_id)
-            .order_by(CallAttempt.started_at.desc())
-        )
-        call_attempts = call_attempts_result.scalars().all()
-
         # Prepare response
-        response_data = {
-            "contact_id": contact.contact_id,
-            "full_name": contact.full_name,
-            "phone_number": contact.phone_number,
-            "language": contact.language,
-            "call_attempts": [
-                {
-                    "attempt_id": attempt.attempt_id,
-                    "contact_id": attempt.contact_id,
-                    "started_at": attempt.started_at,
-                    "status": attempt.status,
-                    "lk_room_name": attempt.lk_room_name,
-                }
-                for attempt in call_attempts
-            ],
-        }
-
-        if debt:
-            response_data["debt"] = {
-                "debt_id": debt.debt_id,
-                "amount_due": debt.amount_due,
-                "due_date": debt.due_date,
-                "status": debt.status,
-            }
+        response = ContactDetailResponse.model_validate(contact)
 
-        return ContactDetailResponse(**response_data)
+        return response
 
     except HTTPException:
         raise
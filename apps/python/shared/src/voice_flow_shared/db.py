@@ -1,8 +1,14 @@
 import os
+import asyncio
 
+from sqlalchemy import text
 from sqlalchemy.engine import URL
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "40"))
 
 url = URL.create(
     "postgresql+psycopg_async",
@@ -12,7 +18,20 @@ url = URL.create(
     host="localhost",
     port=5432,
 )
-engine = create_async_engine(url, future=True, echo=False)
+engine = create_async_engine(
+    url,
+    future=True,
+    echo=False,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    # Queries are short, so recycling covers stale connections without a ping
+    pool_recycle=1800,
+    pool_pre_ping=False,
+    # psycopg prepares a statement server-side once it has run this many times
+    # on a connection, and the same handful of statements repeat on every call
+    connect_args={"prepare_threshold": 1},
+)
 SessionLocal = async_sessionmaker(engine, expire_on_commit=False)
 
 
@@ -20,10 +39,21 @@ class Base(DeclarativeBase):
     pass
 
 
+async def warm_pool():
+    """Open the pooled connections up front so requests don't pay the connect cost."""
+    conns = await asyncio.gather(*(engine.connect() for _ in range(DB_POOL_SIZE)))
+    for conn in conns:
+        await conn.close()
+
+
 async def init_db():
     async with engine.begin() as conn:
+        # The trigram indexes on contacts need pg_trgm
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
         await conn.run_sync(Base.metadata.create_all)
 
+    await warm_pool()
+
 
 async def get_db():
     async with SessionLocal() as session:
@@ -1,4 +1,4 @@
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy import (
     Integer,
     String,
@@ -6,13 +6,15 @@ from sqlalchemy import (
     ForeignKey,
     Enum,
     Text,
+    Index,
+    text,
 )
 from datetime import datetime
-from enum import Enum as PyEnum
-from .db import Base
+from enum import StrEnum
+from .db import Base, engine
 
 
-class ResolutionType(PyEnum):
+class ResolutionType(StrEnum):
     PROMISE_TO_PAY = "promise_to_pay"
     EXTENSION = "extension"
     DISPUTE = "dispute"
@@ -23,17 +25,40 @@ class ResolutionType(PyEnum):
 
 class Contact(Base):
     __tablename__ = "contacts"
+    __table_args__ = (
+        # Trigram indexes let the partial-match contact search use ILIKE/LIKE
+        Index(
+            "ix_contacts_full_name_trgm",
+            "full_name",
+            postgresql_using="gin",
+            postgresql_ops={"full_name": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_contacts_phone_number_trgm",
+            "phone_number",
+            postgresql_using="gin",
+            postgresql_ops={"phone_number": "gin_trgm_ops"},
+        ),
+    )
+
     contact_id: Mapped[int] = mapped_column(Integer, primary_key=True)
     full_name: Mapped[str] = mapped_column(String(120))
     phone_number: Mapped[str] = mapped_column(String(32), unique=True)
     language: Mapped[str] = mapped_column(String(16), default="en-US")
 
+    debt: Mapped["Debt | None"] = relationship(passive_deletes=True)
+    call_attempts: Mapped[list["CallAttempt"]] = relationship(
+        back_populates="contact",
+        order_by="desc(CallAttempt.started_at)",
+        passive_deletes=True,
+    )
+
 
 class Debt(Base):
     __tablename__ = "debts"
     debt_id: Mapped[int] = mapped_column(Integer, primary_key=True)
     contact_id: Mapped[int] = mapped_column(
-        ForeignKey("contacts.contact_id", ondelete="CASCADE")
+        ForeignKey("contacts.contact_id", ondelete="CASCADE"), index=True
     )
     amount_due: Mapped[int] = mapped_column(Integer)
     due_date: Mapped[datetime | None]
@@ -42,12 +67,24 @@ class Debt(Base):
 
 class CallAttempt(Base):
     __tablename__ = "call_attempts"
+    __table_args__ = (
+        # Serves both contact_id lookups and a contact's newest-first attempts
+        Index(
+            "ix_call_attempts_contact_started",
+            "contact_id",
+            text("started_at DESC"),
+        ),
+    )
+
     attempt_id: Mapped[int] = mapped_column(Integer, primary_key=True)
     contact_id: Mapped[int] = mapped_column(ForeignKey("contacts.contact_id"))
     started_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
-    status: Mapped[str] = mapped_column(String(32), default="created")
+    status: Mapped[str] = mapped_column(String(32), default="created", index=True)
     lk_room_name: Mapped[str | None] = mapped_column(String(128))
 
+    contact: Mapped["Contact"] = relationship(back_populates="call_attempts")
+    outcome: Mapped["Outcome | None"] = relationship(passive_deletes=True)
+
 
 class Outcome(Base):
     __tablename__ = "outcomes"
@@ -58,3 +95,23 @@ class Outcome(Base):
     description: Mapped[str] = mapped_column(Text)
     promise_amount: Mapped[int | None]
     promise_date: Mapped[datetime | None]
+
+
+# create_all doesn't alter tables that already exist, so give tables created
+# before these indexes were declared the same indexes
+_SCHEMA_UPGRADE = (
+    "CREATE INDEX IF NOT EXISTS ix_contacts_full_name_trgm "
+    "ON contacts USING gin (full_name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_contacts_phone_number_trgm "
+    "ON contacts USING gin (phone_number gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_debts_contact_id ON debts (contact_id)",
+    "CREATE INDEX IF NOT EXISTS ix_call_attempts_status ON call_attempts (status)",
+    "CREATE INDEX IF NOT EXISTS ix_call_attempts_contact_started "
+    "ON call_attempts (contact_id, started_at DESC)",
+)
+
+
+async def upgrade_schema() -> None:
+    async with engine.begin() as conn:
+        for statement in _SCHEMA_UPGRADE:
+            await conn.execute(text(statement))
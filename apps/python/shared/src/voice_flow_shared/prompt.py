@@ -1,5 +1,8 @@
 import os
+import re
 import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
 from functools import lru_cache
 from typing import Optional
 
@@ -7,12 +10,27 @@ from typing import Optional
 # S3 configuration
 S3_BUCKET_NAME = os.getenv("PROMPTS_S3_BUCKET", "voice-flow-prompts")
 PINNED_PROMPT_VERSION = os.getenv("PINNED_PROMPT_VERSION", "v1-v1")
+PROMPT_CACHE_DIR = os.path.expanduser(
+    os.getenv("PROMPT_CACHE_DIR", "~/.cache/voice_flow/prompts")
+)
+
+
+class PromptVersionExistsError(Exception):
+    """Raised when uploading a prompt version that has already been published."""
 
 
 @lru_cache(maxsize=128)
 def _get_s3_client():
     """Get cached S3 client."""
-    return boto3.client('s3')
+    return boto3.client(
+        's3',
+        config=Config(
+            signature_version='s3v4',
+            max_pool_connections=64,
+            retries={'max_attempts': 3, 'mode': 'adaptive'},
+            tcp_keepalive=True,
+        ),
+    )
 
 
 def download_prompt_from_s3(version: Optional[str] = None) -> str:
@@ -31,17 +49,29 @@ def download_prompt_from_s3(version: Optional[str] = None) -> str:
     if version is None:
         version = PINNED_PROMPT_VERSION
     
-    s3_key = f"{version}.txt"
-    
     try:
-        s3_client = _get_s3_client()
-        response = s3_client.get_object(Bucket=S3_BUCKET_NAME, Key=s3_key)
-        prompt_content = response['Body'].read().decode('utf-8')
+        prompt_content, _ = _fetch_prompt(version)
         return prompt_content
     except Exception as e:
         raise Exception(f"Failed to download prompt version {version} from S3: {str(e)}")
 
 
+def _fetch_prompt(version: str, etag: Optional[str] = None) -> tuple[Optional[str], str]:
+    """Get a prompt and its ETag from S3. Given the ETag of a copy already
+    held, returns (None, etag) without a body if that copy is still current.
+    """
+    s3_key = f"{version}.txt"
+    conditions = {'IfNoneMatch': etag} if etag else {}
+
+    try:
+        response = _get_s3_client().get_object(Bucket=S3_BUCKET_NAME, Key=s3_key, **conditions)
+    except ClientError as e:
+        if etag and e.response.get('Error', {}).get('Code') in ('304', 'NotModified'):
+            return None, etag
+        raise
+    return response['Body'].read().decode('utf-8'), response['ETag']
+
+
 def upload_prompt_to_s3(prompt_content: str, version: str) -> None:
     """Upload a prompt to S3 bucket.
     
@@ -50,22 +80,33 @@ def upload_prompt_to_s3(prompt_content: str, version: str) -> None:
         version: The prompt version (e.g., "v1-v2").
         
     Raises:
+        PromptVersionExistsError: If the version has already been published.
         Exception: If the prompt cannot be uploaded.
     """
     s3_key = f"{version}.txt"
     
     try:
         s3_client = _get_s3_client()
+        # Published versions are immutable, which is what lets readers cache
+        # them by version, so refuse to overwrite an existing key
         s3_client.put_object(
             Bucket=S3_BUCKET_NAME,
             Key=s3_key,
             Body=prompt_content.encode('utf-8'),
-            ContentType='text/plain'
+            ContentType='text/plain',
+            IfNoneMatch='*',
         )
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') == 'PreconditionFailed':
+            raise PromptVersionExistsError(f"Prompt version {version} already exists") from e
+        raise Exception(f"Failed to upload prompt version {version} to S3: {str(e)}")
     except Exception as e:
         raise Exception(f"Failed to upload prompt version {version} to S3: {str(e)}")
 
 
+_VERSION_RE = re.compile(r'^(v\d+)-v(\d+)$')
+
+
 def get_next_version(current_version: str) -> str:
     """Generate the next version number for prompt versioning.
     
@@ -75,20 +116,14 @@ def get_next_version(current_version: str) -> str:
     Returns:
         Next version in format "v{base}-v{next}" (e.g., "v1-v3")
     """
-    try:
-        # Parse version format: v{base_version}-v{current_version}
-        parts = current_version.split('-')
-        if len(parts) != 2 or not parts[0].startswith('v') or not parts[1].startswith('v'):
-            raise ValueError("Invalid version format")
-        
-        base_version = parts[0]  # e.g., "v1"
-        current_num = int(parts[1][1:])  # e.g., 2 from "v2"
-        next_num = current_num + 1
-        
-        return f"{base_version}-v{next_num}"
-    except (ValueError, IndexError) as e:
+    # Parse version format: v{base_version}-v{current_version}
+    match = _VERSION_RE.match(current_version)
+    if not match:
         raise ValueError(f"Invalid version format '{current_version}'. Expected format: v{{base}}-v{{current}}")
 
+    base_version, current_num = match.groups()  # e.g., "v1", "2"
+    return f"{base_version}-v{int(current_num) + 1}"
+
 
 # Fallback default prompt (used if S3 download fails)
 DEFAULT_AGENT_PROMPT = """You are a professional debt collection agent calling on behalf of Voice Flow, a telecommunications company. 
@@ -126,38 +161,92 @@ INSTRUCTIONS:
 """
 
 
-def generate_instruction(contact: dict, prompt_version: Optional[str] = None) -> str:
+@lru_cache(maxsize=32)
+def _get_prompt_template(version: str) -> str:
+    """Get cached prompt template. A copy on disk, kept with its S3 ETag,
+    saves re-downloading across processes and restarts; it is revalidated
+    with a conditional GET so a rewritten version is never served stale.
+    """
+    cache_path = os.path.join(PROMPT_CACHE_DIR, f"{version}.txt")
+    etag_path = f"{cache_path}.etag"
+    try:
+        with open(cache_path, encoding='utf-8') as f:
+            cached_content = f.read()
+        with open(etag_path, encoding='utf-8') as f:
+            cached_etag = f.read()
+    except OSError:
+        cached_content = cached_etag = None
+
+    try:
+        prompt_content, etag = _fetch_prompt(version, cached_etag)
+    except Exception as e:
+        if cached_content is None:
+            raise Exception(f"Failed to download prompt version {version} from S3: {str(e)}")
+        print(f"Warning: Could not revalidate prompt version {version}, using disk copy: {e}")
+        return cached_content
+
+    if prompt_content is None:
+        return cached_content
+
+    # Write to temporary files first so readers never see a partial prompt,
+    # and the ETag last so it never vouches for an older prompt
+    try:
+        os.makedirs(PROMPT_CACHE_DIR, exist_ok=True)
+        for path, content in ((cache_path, prompt_content), (etag_path, etag)):
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Warning: Could not cache prompt version {version} on disk: {e}")
+
+    return prompt_content
+
+
+@lru_cache(maxsize=256)
+def _format_prompt(agent_prompt: str, full_name, debt_amount, due_date) -> str:
+    """Get cached formatted prompt, since every turn of a call formats the same one."""
+    return agent_prompt.format(
+        full_name=full_name, debt_amount=debt_amount, due_date=due_date
+    )
+
+
+def generate_instruction(contact, prompt_version: Optional[str] = None) -> str:
     """Generate a personalized prompt for the debt collection agent.
 
     Args:
-        contact: Dictionary containing contact information including:
+        contact: Dictionary, or object with matching attributes, containing
+                contact information including:
                 - full_name: Customer's full name
-                - debt_amount: Outstanding debt amount
+                - amount_due: Outstanding debt amount
                 - due_date: Payment due date
         prompt_version: Optional prompt version to use. If None, uses pinned version.
 
     Returns:
         Formatted prompt string with customer details included
     """
-    # Extract customer details with defaults
-    full_name = contact["full_name"]
-    debt_amount = contact["amount_due"]
-    due_date = contact["due_date"]
+    # Extract customer details
+    if isinstance(contact, dict):
+        full_name = contact["full_name"]
+        debt_amount = contact["amount_due"]
+        due_date = contact["due_date"]
+    else:
+        full_name = contact.full_name
+        debt_amount = contact.amount_due
+        due_date = contact.due_date
 
-    # Format debt amount if it's a number
+    # Format debt amount if it's a number of paise, always with two decimals
     if isinstance(debt_amount, int):
-        debt_amount = f"${(debt_amount / 100)}"
+        debt_amount = f"${debt_amount / 100:.2f}"
 
     # Try to get prompt from S3, fallback to default if it fails
     try:
-        agent_prompt = download_prompt_from_s3(prompt_version)
+        agent_prompt = _get_prompt_template(prompt_version or PINNED_PROMPT_VERSION)
     except Exception as e:
         print(f"Warning: Could not download prompt from S3, using default: {e}")
         agent_prompt = DEFAULT_AGENT_PROMPT
 
-    return agent_prompt.format(
-        full_name=full_name, debt_amount=debt_amount, due_date=due_date
-    )
+    return _format_prompt(agent_prompt, full_name, debt_amount, due_date)
 
 
 def get_current_prompt_version() -> str:
@@ -1,8 +1,13 @@
 import os
-import json
+import re
+import asyncio
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
 from datetime import date
+from functools import lru_cache
 from typing import Any, Dict, List, Tuple
 
+import orjson
 from google.genai import Client
 from google.genai import types
 
@@ -11,13 +16,32 @@ from voice_flow_shared.prompt import generate_instruction
 
 client = Client(api_key=os.getenv("GOOGLE_API_KEY"))
 
+# Bound the Gemini requests in flight across all running test simulations
+MAX_CONCURRENT_LLM_CALLS = int(os.getenv("MAX_CONCURRENT_LLM_CALLS", "10"))
+_llm_slots = asyncio.Semaphore(MAX_CONCURRENT_LLM_CALLS)
+
+
+async def _generate_content(**kwargs) -> types.GenerateContentResponse:
+    async with _llm_slots:
+        return await client.aio.models.generate_content(**kwargs)
+
+
+@dataclass(frozen=True, slots=True)
+class PersonaKey:
+    """The persona fields the agent prompt needs, fixed for a whole conversation."""
+
+    full_name: str
+    amount_due: float
+    due_date: str
 
-def _parse_json(text: str):
-    return json.loads(text.lstrip("```json\n").rstrip("\n```").strip())
 
+# Raw persona JSON by seed prompt, so recurring seeds skip the Gemini call
+PERSONA_CACHE_SIZE = 256
+_persona_json_cache: "OrderedDict[str, str]" = OrderedDict()
 
-def generate_persona(prompt: str) -> Dict[str, Any]:
-    instructions = """
+
+# System instructions are built once at import instead of on every call
+_PERSONA_INSTRUCTIONS = """
     You are an expert persona generator for debt collection testing scenarios. Create realistic, 
     nuanced defaulter personas that provide meaningful training data for debt collection agents.
 
@@ -64,77 +88,19 @@ def generate_persona(prompt: str) -> Dict[str, Any]:
     from empathetic negotiation to firm boundary-setting, while maintaining ethical collection practices.
     Each persona should feel like a real person with genuine circumstances, not a stereotype.
     """
-    response = client.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=[
-            types.Content(
-                **{
-                    "role": "user",
-                    "parts": [
-                        {
-                            "text": f"Generate a defaulter persona based on this description: {prompt}"
-                        }
-                    ],
-                }
-            )
-        ],
-        config=types.GenerateContentConfig(system_instruction=instructions),
-    )
-
-    data = _parse_json(response.text)
-    if isinstance(data.get("due_date"), str):
-        data["due_date"] = date.fromisoformat(data["due_date"])
-
-    if "debt_amount" in data:
-        data["debt_amount"] = int(data["debt_amount"])
-
-    required = {"full_name", "age", "gender", "debt_amount", "due_date", "description"}
-    missing = sorted(required - set(data))
-
-    if missing:
-        raise RuntimeError(f"Persona JSON missing fields: {', '.join(missing)}")
-
-    return data
-
-
-def agent_reply(persona: Dict[str, Any], history: List[Dict[str, str]]) -> str:
-    instructions = generate_instruction(persona)
-
-    # Convert history format from {"persona": "...", "agent": "..."} to Google GenAI format
-    # For agent_reply: persona becomes "user" and agent becomes "model"
-    contents = []
-    for entry in history:
-        if "persona" in entry:
-            contents.append(
-                types.Content(**{"role": "user", "parts": [{"text": entry["persona"]}]})
-            )
-        if "agent" in entry:
-            contents.append(
-                types.Content(**{"role": "model", "parts": [{"text": entry["agent"]}]})
-            )
-
-    response = client.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=contents,
-        config=types.GenerateContentConfig(system_instruction=instructions),
-    )
-
-    return response.text
-
 
-def persona_reply(persona: Dict[str, Any], history: List[Dict[str, str]]) -> str:
-    instructions = f"""
+_PERSONA_REPLY_TEMPLATE = """
     You are roleplaying as a defaulter (debtor) in a debt collection scenario for training purposes.
     
     PERSONA DETAILS:
-    - Name: {persona.get("full_name", "Unknown")}
-    - Age: {persona.get("age", "Unknown")}
-    - Gender: {persona.get("gender", "Unknown")}
-    - Outstanding Debt: ${persona.get("debt_amount", "Unknown")}
-    - Due Date: {persona.get("due_date", "Unknown")}
+    - Name: {full_name}
+    - Age: {age}
+    - Gender: {gender}
+    - Outstanding Debt: ${debt_amount}
+    - Due Date: {due_date}
     
     PERSONA BACKGROUND:
-    {persona.get("description", "No additional background provided.")}
+    {description}
     
     ROLEPLAY INSTRUCTIONS:
     - Stay completely in character as this defaulter throughout the conversation
@@ -151,32 +117,7 @@ def persona_reply(persona: Dict[str, Any], history: List[Dict[str, str]]) -> str
     - Generate output only in plain english. DON'T use markdown format
     """
 
-    # Convert history format from {"persona": "...", "agent": "..."} to Google GenAI format
-    # For persona_reply: agent becomes "user" and persona becomes "model"
-    contents = []
-    for entry in history:
-        if "agent" in entry:
-            contents.append(
-                types.Content(**{"role": "user", "parts": [{"text": entry["agent"]}]})
-            )
-        if "persona" in entry:
-            contents.append(
-                types.Content(
-                    **{"role": "model", "parts": [{"text": entry["persona"]}]}
-                )
-            )
-
-    response = client.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=contents,
-        config=types.GenerateContentConfig(system_instruction=instructions),
-    )
-
-    return response.text
-
-
-def validate_conversation(history: List[Dict[str, str]]) -> Tuple[Dict[str, str], str, str]:
-    instruction = """
+_VALIDATOR_INSTRUCTIONS = """
     You are an expert evaluator of debt collection conversations for training purposes. 
     Analyze the conversation between a debt collection agent and a defaulter to provide metrics and pass/fail status.
     
@@ -211,34 +152,179 @@ def validate_conversation(history: List[Dict[str, str]]) -> Tuple[Dict[str, str]
     Remember: The agent must be polite but firm, empathetic but persistent. Too polite = fail, impolite = fail, weak negotiation = fail.
     """
 
+_PROMPT_IMPROVER_INSTRUCTIONS = """
+    You are an expert prompt engineer specializing in debt collection training scenarios.
+    Your task is to improve an existing debt collection agent prompt based on performance metrics and detailed feedback.
+    
+    IMPROVEMENT CRITERIA:
+    The goal is to create a prompt that helps agents achieve:
+    - POLITENESS: Exactly "polite" (respectful but firm, professional without being overly accommodating)
+    - NEGOTIATION_LEVEL: Exactly "hard" (strong, persistent approach that presses for payment commitments)
+    
+    PROMPT IMPROVEMENT GUIDELINES:
+    1. Analyze the current prompt and identify areas that need strengthening
+    2. If politeness was "too_polite": Add more assertive language, reduce overly accommodating phrases
+    3. If politeness was "impolite" or "too_impolite": Add more respectful, empathetic language
+    4. If negotiation_level was "low" or "medium": Add stronger negotiation tactics, more persistent approaches
+    5. Maintain the core structure but enhance specific sections that relate to the feedback
+    6. Ensure the improved prompt maintains professionalism while being more effective
+    7. Keep all existing formatting placeholders ({full_name}, {debt_amount}, {due_date})
+    8. Preserve the essential debt collection best practices and legal compliance aspects
+    
+    RESPONSE FORMAT:
+    Respond with ONLY the improved prompt text. Do not include any explanations, comments, or markdown formatting.
+    The output should be the complete, ready-to-use prompt that can directly replace the current one.
+    """
+
+# Placeholders an improved prompt must keep, found in a single scan
+_REQUIRED_PLACEHOLDERS = ("full_name", "debt_amount", "due_date")
+_PLACEHOLDER_RE = re.compile(r"\{(full_name|debt_amount|due_date)\}")
+
+
+def _parse_json(text: str):
+    # Drop a surrounding ```json fence, if the model added one
+    text = text.strip().removeprefix("```json").removeprefix("```")
+    text = text.removesuffix("```")
+    return orjson.loads(text)
+
+
+async def _generate_persona_json(prompt: str) -> str:
+    response = await _generate_content(
+        model="gemini-2.0-flash",
+        contents=[
+            types.Content(
+                role="user",
+                parts=[
+                    types.Part(
+                        text=f"Generate a defaulter persona based on this description: {prompt}"
+                    )
+                ],
+            )
+        ],
+        config=types.GenerateContentConfig(system_instruction=_PERSONA_INSTRUCTIONS),
+    )
+
+    return response.text
+
+
+async def generate_persona(prompt: str) -> Dict[str, Any]:
+    text = _persona_json_cache.get(prompt)
+    if text is not None:
+        _persona_json_cache.move_to_end(prompt)
+    else:
+        text = await _generate_persona_json(prompt)
+
+    data = _parse_json(text)
+    if isinstance(data.get("due_date"), str):
+        data["due_date"] = date.fromisoformat(data["due_date"])
+
+    if "debt_amount" in data:
+        data["debt_amount"] = int(data["debt_amount"])
+
+    required = {"full_name", "age", "gender", "debt_amount", "due_date", "description"}
+    missing = sorted(required - set(data))
+
+    if missing:
+        raise RuntimeError(f"Persona JSON missing fields: {', '.join(missing)}")
+
+    # Only cache output that produced a valid persona
+    _persona_json_cache[prompt] = text
+    if len(_persona_json_cache) > PERSONA_CACHE_SIZE:
+        _persona_json_cache.popitem(last=False)
+
+    return data
+
+
+generate_persona.cache_clear = _persona_json_cache.clear
+
+
+async def agent_reply(
+    persona: PersonaKey | Dict[str, Any], history: List[Dict[str, str]]
+) -> str:
+    instructions = generate_instruction(persona)
+
+    # Convert history format from {"persona": "...", "agent": "..."} to Google GenAI format
+    # For agent_reply: persona becomes "user" and agent becomes "model"
+    contents = [
+        types.Content(role=role, parts=[types.Part(text=entry[speaker])])
+        for entry in history
+        for speaker, role in (("persona", "user"), ("agent", "model"))
+        if speaker in entry
+    ]
+
+    response = await _generate_content(
+        model="gemini-2.0-flash",
+        contents=contents,
+        config=types.GenerateContentConfig(system_instruction=instructions),
+    )
+
+    return response.text
+
+
+_PERSONA_KEY_FIELDS = ("full_name", "age", "gender", "debt_amount", "due_date", "description")
+
+
+@lru_cache(maxsize=1024)
+def _persona_system_prompt(persona_key: Tuple[Any, ...]) -> str:
+    """Format the roleplay prompt once per persona, every turn reuses it."""
+    fields = {k: v for k, v in zip(_PERSONA_KEY_FIELDS, persona_key) if v is not None}
+    return _PERSONA_REPLY_TEMPLATE.format_map(
+        defaultdict(
+            lambda: "Unknown",
+            {"description": "No additional background provided.", **fields},
+        )
+    )
+
+
+async def persona_reply(persona: Dict[str, Any], history: List[Dict[str, str]]) -> str:
+    instructions = _persona_system_prompt(
+        tuple(persona.get(k) for k in _PERSONA_KEY_FIELDS)
+    )
+
+    # Convert history format from {"persona": "...", "agent": "..."} to Google GenAI format
+    # For persona_reply: agent becomes "user" and persona becomes "model"
+    contents = [
+        types.Content(role=role, parts=[types.Part(text=entry[speaker])])
+        for entry in history
+        for speaker, role in (("agent", "user"), ("persona", "model"))
+        if speaker in entry
+    ]
+
+    response = await _generate_content(
+        model="gemini-2.0-flash",
+        contents=contents,
+        config=types.GenerateContentConfig(system_instruction=instructions),
+    )
+
+    return response.text
+
+
+async def validate_conversation(history: List[Dict[str, str]]) -> Tuple[Dict[str, str], str, str]:
+
     # Format the conversation history for the validator
     conversation_text = "\n".join(
-        [
-            f"Agent: {entry.get('agent', '')}"
-            if "agent" in entry
-            else f"Defaulter: {entry.get('persona', '')}"
-            for entry in history
-            if entry
-        ]
+        f"Agent: {entry['agent']}"
+        if "agent" in entry
+        else f"Defaulter: {entry.get('persona', '')}"
+        for entry in history
+        if entry
     )
 
     contents = [
         types.Content(
-            **{
-                "role": "user",
-                "parts": [
-                    {
-                        "text": f"Evaluate this debt collection conversation:\n\n{conversation_text}"
-                    }
-                ],
-            }
+            role="user",
+            parts=[
+                types.Part(
+                    text=f"Evaluate this debt collection conversation:\n\n{conversation_text}"
+                )
+            ],
         )
     ]
 
-    response = client.models.generate_content(
+    response = await _generate_content(
         model="gemini-2.5-flash",
         contents=contents,
-        config=types.GenerateContentConfig(system_instruction=instruction),
+        config=types.GenerateContentConfig(system_instruction=_VALIDATOR_INSTRUCTIONS),
     )
 
     data = _parse_json(response.text)
@@ -263,7 +349,7 @@ def validate_conversation(history: List[Dict[str, str]]) -> Tuple[Dict[str, str]
     return metric, feedback, status
 
 
-def improve_prompt(current_prompt: str, metric: Dict[str, str], feedback: str) -> str:
+async def improve_prompt(current_prompt: str, metric: Dict[str, str], feedback: str) -> str:
     """Improve a prompt based on test run metrics and feedback.
     
     Args:
@@ -277,29 +363,6 @@ def improve_prompt(current_prompt: str, metric: Dict[str, str], feedback: str) -
     Raises:
         RuntimeError: If prompt improvement fails.
     """
-    instructions = """
-    You are an expert prompt engineer specializing in debt collection training scenarios.
-    Your task is to improve an existing debt collection agent prompt based on performance metrics and detailed feedback.
-    
-    IMPROVEMENT CRITERIA:
-    The goal is to create a prompt that helps agents achieve:
-    - POLITENESS: Exactly "polite" (respectful but firm, professional without being overly accommodating)
-    - NEGOTIATION_LEVEL: Exactly "hard" (strong, persistent approach that presses for payment commitments)
-    
-    PROMPT IMPROVEMENT GUIDELINES:
-    1. Analyze the current prompt and identify areas that need strengthening
-    2. If politeness was "too_polite": Add more assertive language, reduce overly accommodating phrases
-    3. If politeness was "impolite" or "too_impolite": Add more respectful, empathetic language
-    4. If negotiation_level was "low" or "medium": Add stronger negotiation tactics, more persistent approaches
-    5. Maintain the core structure but enhance specific sections that relate to the feedback
-    6. Ensure the improved prompt maintains professionalism while being more effective
-    7. Keep all existing formatting placeholders ({full_name}, {debt_amount}, {due_date})
-    8. Preserve the essential debt collection best practices and legal compliance aspects
-    
-    RESPONSE FORMAT:
-    Respond with ONLY the improved prompt text. Do not include any explanations, comments, or markdown formatting.
-    The output should be the complete, ready-to-use prompt that can directly replace the current one.
-    """
     
     prompt_content = f"""
     CURRENT PROMPT:
@@ -316,26 +379,21 @@ def improve_prompt(current_prompt: str, metric: Dict[str, str], feedback: str) -
     """
     
     contents = [
-        types.Content(
-            **{
-                "role": "user",
-                "parts": [{"text": prompt_content}],
-            }
-        )
+        types.Content(role="user", parts=[types.Part(text=prompt_content)])
     ]
     
     try:
-        response = client.models.generate_content(
+        response = await _generate_content(
             model="gemini-2.0-flash",
             contents=contents,
-            config=types.GenerateContentConfig(system_instruction=instructions),
+            config=types.GenerateContentConfig(system_instruction=_PROMPT_IMPROVER_INSTRUCTIONS),
         )
         
         improved_prompt = response.text.strip()
         
         # Basic validation to ensure the improved prompt contains required placeholders
-        required_placeholders = ['{full_name}', '{debt_amount}', '{due_date}']
-        missing_placeholders = [p for p in required_placeholders if p not in improved_prompt]
+        found = set(_PLACEHOLDER_RE.findall(improved_prompt))
+        missing_placeholders = [f"{{{p}}}" for p in _REQUIRED_PLACEHOLDERS if p not in found]
         
         if missing_placeholders:
             raise RuntimeError(f"Improved prompt is missing required placeholders: {missing_placeholders}")
@@ -7,10 +7,14 @@ load_dotenv(".env.local")
 
 
 from voice_flow_shared.db import init_db
-from voice_flow_testing.router import router
+from voice_flow_testing.models import upgrade_schema
+from voice_flow_testing.router import cancel_simulations, router
 
 app = FastAPI(
-    title="Voice Flow Testing Platform", version="1.0.0", on_startup=[init_db]
+    title="Voice Flow Testing Platform",
+    version="1.0.0",
+    on_startup=[init_db, upgrade_schema],
+    on_shutdown=[cancel_simulations],
 )
 app.add_middleware(
     CORSMiddleware,
@@ -1,10 +1,10 @@
 from datetime import date
 from typing import Dict, List, Optional
 
-from sqlalchemy import Date, ForeignKey, Integer, String, Text, JSON, Float
+from sqlalchemy import Date, ForeignKey, Integer, String, Text, JSON, Float, Index, event, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
-from voice_flow_shared.db import Base
+from voice_flow_shared.db import Base, engine
 
 
 class Persona(Base):
@@ -25,19 +25,82 @@ class Persona(Base):
 
 class TestRun(Base):
     __tablename__ = "test_runs"
+    __table_args__ = (Index("ix_test_runs_status_prompt_version", "status", "prompt_version"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String(255), nullable=False)
     persona_id: Mapped[int] = mapped_column(
         ForeignKey("personas.id"), nullable=False, index=True
     )
-    conversation: Mapped[Optional[List[Dict[str, str]]]] = mapped_column(
-        JSON, nullable=True
-    )
     # metric: {"politeness": "too_polite|polite|impolite|too_impolite", "negotiation_level": "low|medium|hard"}
     metric: Mapped[Optional[Dict[str, str]]] = mapped_column(JSON, nullable=True)
+    # Mirrored from metric so analytics can filter on an index instead of JSON paths
+    politeness: Mapped[Optional[str]] = mapped_column(String(20), nullable=True, index=True)
+    negotiation_level: Mapped[Optional[str]] = mapped_column(String(20), nullable=True, index=True)
     feedback: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     status: Mapped[Optional[str]] = mapped_column(String(50), nullable=True, default="running")
     prompt_version: Mapped[Optional[str]] = mapped_column(String(50), nullable=True)
 
     persona: Mapped[Persona] = relationship(back_populates="test_runs")
+    # The conversation, one row per message so each turn is a plain insert
+    messages: Mapped[List["TestRunMessage"]] = relationship(
+        order_by="TestRunMessage.seq", cascade="all, delete-orphan", passive_deletes=True
+    )
+
+
+class TestRunMessage(Base):
+    __tablename__ = "test_run_messages"
+
+    # The (test_run_id, seq) key also serves reading a run's messages in order
+    test_run_id: Mapped[int] = mapped_column(
+        ForeignKey("test_runs.id", ondelete="CASCADE"), primary_key=True
+    )
+    seq: Mapped[int] = mapped_column(Integer, primary_key=True)
+    role: Mapped[str] = mapped_column(String(20))
+    content: Mapped[str] = mapped_column(Text)
+
+
+@event.listens_for(TestRun, "before_insert")
+@event.listens_for(TestRun, "before_update")
+def _mirror_metric_columns(mapper, connection, target: TestRun) -> None:
+    metric = target.metric or {}
+    target.politeness = metric.get("politeness")
+    target.negotiation_level = metric.get("negotiation_level")
+
+
+# create_all doesn't alter tables that already exist, so bring a test_runs
+# table created before the mirrored metric columns up to date
+_TEST_RUNS_UPGRADE = (
+    "ALTER TABLE test_runs ADD COLUMN IF NOT EXISTS politeness VARCHAR(20)",
+    "ALTER TABLE test_runs ADD COLUMN IF NOT EXISTS negotiation_level VARCHAR(20)",
+    "CREATE INDEX IF NOT EXISTS ix_test_runs_politeness ON test_runs (politeness)",
+    "CREATE INDEX IF NOT EXISTS ix_test_runs_negotiation_level ON test_runs (negotiation_level)",
+    "CREATE INDEX IF NOT EXISTS ix_test_runs_status_prompt_version ON test_runs (status, prompt_version)",
+    "UPDATE test_runs SET politeness = metric->>'politeness', negotiation_level = metric->>'negotiation_level' "
+    "WHERE metric IS NOT NULL AND politeness IS NULL AND negotiation_level IS NULL",
+    # Runs from before test_run_messages kept their conversation in a json
+    # column on test_runs; copy those messages over so they still list
+    """
+    DO $$
+    BEGIN
+        IF EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'test_runs' AND column_name = 'conversation'
+        ) THEN
+            INSERT INTO test_run_messages (test_run_id, seq, role, content)
+            SELECT t.id, e.ord - 1, k.key, k.value
+            FROM test_runs t,
+                json_array_elements(t.conversation::json) WITH ORDINALITY e(msg, ord),
+                json_each_text(e.msg) k
+            WHERE json_typeof(t.conversation::json) = 'array'
+            ON CONFLICT DO NOTHING;
+        END IF;
+    END $$
+    """,
+)
+
+
+async def upgrade_schema() -> None:
+    async with engine.begin() as conn:
+        for statement in _TEST_RUNS_UPGRADE:
+            await conn.execute(text(statement))
@@ -1,9 +1,12 @@
 from __future__ import annotations
 
+import os
 import asyncio
+from collections import defaultdict
 from datetime import date
 from typing import Any, Dict, List
 
+import orjson
 from fastapi import (
     APIRouter,
     Depends,
@@ -11,11 +14,11 @@ from fastapi import (
     WebSocket,
     WebSocketDisconnect,
     Query,
+    Response,
 )
-from pydantic import BaseModel
-from sqlalchemy import select
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy import insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 
 from voice_flow_shared.db import SessionLocal, get_db
 from voice_flow_shared.prompt import (
@@ -23,16 +26,47 @@ from voice_flow_shared.prompt import (
     upload_prompt_to_s3,
     get_current_prompt_version,
     get_next_version,
+    PromptVersionExistsError,
 )
-from voice_flow_testing.models import Persona, TestRun
+from voice_flow_testing.models import Persona, TestRun, TestRunMessage
 from voice_flow_testing import llm
 
 router = APIRouter()
 
+# Every simulated conversation starts with the persona answering the call
+PERSONA_OPENING = "Hello."
+
+# Bound the simulations running at once; later ones wait for a free slot
+MAX_CONCURRENT_SIMULATIONS = int(os.getenv("MAX_CONCURRENT_SIMULATIONS", "16"))
+_simulation_slots = asyncio.Semaphore(MAX_CONCURRENT_SIMULATIONS)
+
+# Keep references to running simulations so they aren't garbage collected
+# mid-run and can be cancelled on shutdown
+simulations: set[asyncio.Task] = set()
+
+
+async def cancel_simulations() -> None:
+    for task in simulations:
+        task.cancel()
+    await asyncio.gather(*simulations, return_exceptions=True)
+
+
+# Every turn frame has the same shape, so only the two messages are encoded
+_TURN_FRAME = (
+    '{{"type":"turn","messages":['
+    '{{"role":"agent","content":{agent}}},'
+    '{{"role":"persona","content":{persona}}}]}}'
+)
+
+# Messages a test run may have waiting for its writer before the oldest are dropped
+WS_QUEUE_SIZE = 256
+
 
 class WSManager:
     def __init__(self) -> None:
         self._connections: dict[int, set[WebSocket]] = {}
+        self._queues: dict[int, asyncio.Queue[dict[str, Any] | str | None]] = {}
+        self._writers: dict[int, asyncio.Task] = {}
 
     async def connect(self, test_run_id: int, websocket: WebSocket) -> None:
         await websocket.accept()
@@ -45,19 +79,56 @@ class WSManager:
             if not conns:
                 self._connections.pop(test_run_id, None)
 
-    async def broadcast(self, test_run_id: int, message: dict[str, Any]) -> None:
-        import json
+    async def broadcast(
+        self, test_run_id: int, message: dict[str, Any] | str
+    ) -> None:
+        conns = self._connections.get(test_run_id)
+        if not conns:
+            return
+        # Encode once per broadcast, unless the caller already did; the web
+        # client parses text frames
+        payload = message if isinstance(message, str) else orjson.dumps(message).decode()
 
-        conns = self._connections.get(test_run_id, set())
-        dead: List[WebSocket] = []
-        payload = json.dumps(message)
-        for ws in list(conns):
+        async def _safe_send(ws: WebSocket) -> bool:
             try:
                 await ws.send_text(payload)
+                return True
             except Exception:
-                dead.append(ws)
-        for ws in dead:
-            self.disconnect(test_run_id, ws)
+                return False
+
+        # Send to every viewer at once so one slow client doesn't stall the rest
+        targets = tuple(conns)
+        results = await asyncio.gather(*(_safe_send(ws) for ws in targets))
+        for ws, ok in zip(targets, results):
+            if not ok:
+                self.disconnect(test_run_id, ws)
+
+    def publish(self, test_run_id: int, message: dict[str, Any] | str) -> None:
+        """Queue a message for the run's writer task without waiting on clients."""
+        queue = self._queues.get(test_run_id)
+        if queue is None:
+            queue = self._queues[test_run_id] = asyncio.Queue(maxsize=WS_QUEUE_SIZE)
+            self._writers[test_run_id] = asyncio.create_task(self._writer(test_run_id))
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(message)
+
+    def finish(self, test_run_id: int) -> None:
+        """Let the run's writer exit once it has sent everything queued."""
+        queue = self._queues.get(test_run_id)
+        if queue is not None:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+    async def _writer(self, test_run_id: int) -> None:
+        queue = self._queues[test_run_id]
+        try:
+            while (message := await queue.get()) is not None:
+                await self.broadcast(test_run_id, message)
+        finally:
+            self._queues.pop(test_run_id, None)
+            self._writers.pop(test_run_id, None)
 
 
 ws_manager = WSManager()
@@ -100,12 +171,16 @@ class TestResponse(BaseModel):
     prompt_version: str | None
 
 
+_PERSONA_LIST_ADAPTER = TypeAdapter(list[PersonaResponse])
+_TEST_LIST_ADAPTER = TypeAdapter(list[TestResponse])
+
+
 @router.post("/personas/generate", response_model=PersonaResponse)
 async def generate_persona(
     req: PersonaGenerateRequest, db: AsyncSession = Depends(get_db)
 ):
     try:
-        data = await asyncio.to_thread(llm.generate_persona, req.prompt)
+        data = await llm.generate_persona(req.prompt)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Persona generation failed: {e}")
 
@@ -131,23 +206,38 @@ async def list_personas(
     limit: int = Query(
         100, ge=1, le=1000, description="Maximum number of records to return"
     ),
+    before_id: int | None = Query(
+        None, description="Only return records older than this ID (keyset cursor)"
+    ),
 ):
-    result = await db.execute(
-        select(Persona).order_by(Persona.id.desc()).offset(skip).limit(limit)
-    )
-    personas = result.scalars().all()
-    return [
-        PersonaResponse(
-            id=p.id,
-            full_name=p.full_name,
-            age=p.age,
-            gender=p.gender,
-            debt_amount=float(p.debt_amount),
-            due_date=p.due_date,
-            description=p.description,
+    # Select plain columns; the rows go straight into the response, so ORM
+    # objects would only be built to be thrown away
+    stmt = (
+        select(
+            Persona.id,
+            Persona.full_name,
+            Persona.age,
+            Persona.gender,
+            Persona.debt_amount,
+            Persona.due_date,
+            Persona.description,
         )
-        for p in personas
-    ]
+        .order_by(Persona.id.desc())
+        .offset(skip)
+        .limit(limit)
+    )
+    # A cursor keeps deep pages O(limit), where OFFSET scans the skipped rows
+    if before_id is not None:
+        stmt = stmt.where(Persona.id < before_id)
+    result = await db.execute(stmt)
+    # The rows come from our own schema, so skip re-validating each one and
+    # serialize the whole page in one pass
+    return Response(
+        _PERSONA_LIST_ADAPTER.dump_json(
+            [PersonaResponse.model_construct(**row._mapping) for row in result.all()]
+        ),
+        media_type="application/json",
+    )
 
 
 @router.get("/tests", response_model=list[TestResponse])
@@ -157,30 +247,56 @@ async def list_tests(
     limit: int = Query(
         100, ge=1, le=1000, description="Maximum number of records to return"
     ),
+    before_id: int | None = Query(
+        None, description="Only return records older than this ID (keyset cursor)"
+    ),
 ):
-    result = await db.execute(
-        select(TestRun)
-        .options(selectinload(TestRun.persona))
+    # Each run has exactly one persona and only its name is needed, so join it
+    # in and select plain columns instead of building ORM objects
+    stmt = (
+        select(
+            TestRun.id,
+            TestRun.name,
+            TestRun.persona_id,
+            Persona.full_name.label("persona_name"),
+            TestRun.metric,
+            TestRun.feedback,
+            TestRun.status,
+            TestRun.prompt_version,
+        )
+        .join(TestRun.persona)
         .order_by(TestRun.id.desc())
         .offset(skip)
         .limit(limit)
     )
-    test_runs = result.scalars().all()
-
-    return [
-        TestResponse(
-            id=tr.id,
-            name=tr.name,
-            persona_id=tr.persona_id,
-            persona_name=tr.persona.full_name,
-            conversation=tr.conversation,
-            metric=tr.metric,
-            feedback=tr.feedback,
-            status=tr.status,
-            prompt_version=tr.prompt_version,
+    # A cursor keeps deep pages O(limit), where OFFSET scans the skipped rows
+    if before_id is not None:
+        stmt = stmt.where(TestRun.id < before_id)
+    result = await db.execute(stmt)
+    rows = result.all()
+
+    # Fetch the page's conversations in one ordered query
+    conversations: Dict[int, List[Dict[str, str]]] = defaultdict(list)
+    if rows:
+        messages = await db.execute(
+            select(TestRunMessage.test_run_id, TestRunMessage.role, TestRunMessage.content)
+            .where(TestRunMessage.test_run_id.in_([row.id for row in rows]))
+            .order_by(TestRunMessage.test_run_id, TestRunMessage.seq)
         )
-        for tr in test_runs
-    ]
+        for test_run_id, role, content in messages:
+            conversations[test_run_id].append({role: content})
+
+    # The rows come from our own schema, so skip re-validating each one and
+    # serialize the whole page in one pass
+    return Response(
+        _TEST_LIST_ADAPTER.dump_json(
+            [
+                TestResponse.model_construct(**row._mapping, conversation=conversations[row.id])
+                for row in rows
+            ]
+        ),
+        media_type="application/json",
+    )
 
 
 @router.post("/tests/start", response_model=TestStartResponse)
@@ -192,7 +308,7 @@ async def start_test(req: TestStartRequest, db: AsyncSession = Depends(get_db)):
     test_run = TestRun(
         persona_id=persona.id,
         name=req.name,
-        conversation=[{"persona": "Hello."}],
+        messages=[TestRunMessage(seq=0, role="persona", content=PERSONA_OPENING)],
         metric=None,
         feedback=None,
         status="running",
@@ -202,7 +318,24 @@ async def start_test(req: TestStartRequest, db: AsyncSession = Depends(get_db)):
     await db.commit()
     await db.refresh(test_run)
 
-    asyncio.create_task(_run_test_simulation(test_run, persona.id, req.iterations))
+    persona_payload: Dict[str, Any] = {
+        "id": persona.id,
+        "full_name": persona.full_name,
+        "age": persona.age,
+        "gender": persona.gender,
+        "amount_due": float(persona.debt_amount),
+        "due_date": persona.due_date.isoformat(),
+        "description": persona.description,
+    }
+    simulation = asyncio.create_task(
+        _run_test_simulation(
+            test_run.id, persona_payload, [{"persona": PERSONA_OPENING}], req.iterations
+        )
+    )
+    simulations.add(simulation)
+    simulation.add_done_callback(simulations.discard)
+    # Stop the run's WebSocket writer however the simulation ends
+    simulation.add_done_callback(lambda _: ws_manager.finish(test_run.id))
 
     return TestStartResponse(test_run_id=test_run.id, ws_url=f"/ws/tests/{test_run.id}")
 
@@ -259,21 +392,25 @@ async def improve_prompt_from_test_run(
         # Get the current pinned prompt version (or the version used in the test run)
         current_version = test_run.prompt_version or get_current_prompt_version()
         
-        # Download the current prompt from S3
-        current_prompt = download_prompt_from_s3(current_version)
+        # Download the current prompt from S3, off the event loop
+        current_prompt = await asyncio.to_thread(download_prompt_from_s3, current_version)
         
         # Improve the prompt using LLM
-        improved_prompt = llm.improve_prompt(
+        improved_prompt = await llm.improve_prompt(
             current_prompt=current_prompt,
             metric=test_run.metric,
             feedback=test_run.feedback
         )
         
-        # Generate the next version number
+        # Upload the improved prompt to S3 under the next free version number,
+        # off the event loop; published versions are never overwritten
         new_version = get_next_version(current_version)
-        
-        # Upload the improved prompt to S3
-        upload_prompt_to_s3(improved_prompt, new_version)
+        while True:
+            try:
+                await asyncio.to_thread(upload_prompt_to_s3, improved_prompt, new_version)
+                break
+            except PromptVersionExistsError:
+                new_version = get_next_version(new_version)
         
         return PromptImproveResponse(
             success=True,
@@ -289,113 +426,119 @@ async def improve_prompt_from_test_run(
 
 
 async def _update_conversation_history(
-    db: AsyncSession, test_run: TestRun, new_entry: Dict[str, str]
-) -> List[Dict[str, str]]:
-    """Update the conversation history in the database with a new entry."""
-    # Add new entry to conversation
-    test_run.conversation = test_run.conversation + [new_entry]
+    db: AsyncSession,
+    test_run_id: int,
+    first_seq: int,
+    new_entries: List[Dict[str, str]],
+) -> None:
+    """Append a turn's entries to the conversation history in one commit."""
+    # Each message is its own row, so a turn only inserts what it adds; the
+    # caller keeps its own copy of the history for the LLM calls
+    await db.execute(
+        insert(TestRunMessage),
+        [
+            {"test_run_id": test_run_id, "seq": seq, "role": role, "content": content}
+            for seq, entry in enumerate(new_entries, first_seq)
+            for role, content in entry.items()
+        ],
+    )
     await db.commit()
-    await db.refresh(test_run)
-
-    return test_run.conversation
 
 
 async def _run_test_simulation(
-    test_run: TestRun, persona_id: int, iterations: int
+    test_run_id: int,
+    persona_dict: Dict[str, Any],
+    conversation: List[Dict[str, str]] | None,
+    iterations: int,
 ) -> None:
-    async with SessionLocal() as db:
-        # Fetch the test_run from this database session
-        test_run = await db.get(TestRun, test_run.id)
-        if not test_run:
-            await ws_manager.broadcast(
-                test_run.id, {"type": "error", "message": "Test run not found"}
-            )
-            return
-            
-        persona = await db.get(Persona, persona_id)
-        if not persona:
-            await ws_manager.broadcast(
-                test_run.id, {"type": "error", "message": "Persona not found"}
-            )
-            return
+    # The caller already has the test run and persona, so nothing is re-read
+    # here; the run's row is only touched to record its progress
+    async with _simulation_slots, SessionLocal() as db:
+        agent_persona = llm.PersonaKey(
+            full_name=persona_dict["full_name"],
+            amount_due=persona_dict["amount_due"],
+            due_date=persona_dict["due_date"],
+        )
 
-        persona_dict: Dict[str, Any] = {
-            "id": persona.id,
-            "full_name": persona.full_name,
-            "age": persona.age,
-            "gender": persona.gender,
-            "amount_due": float(persona.debt_amount),
-            "due_date": persona.due_date.isoformat(),
-            "description": persona.description,
-        }
-
-        # Initialize conversation history from database for LLM calls
-        history: List[Dict[str, str]] = test_run.conversation or []
-        await ws_manager.broadcast(
-            test_run.id,
+        # Initialize conversation history for LLM calls
+        history: List[Dict[str, str]] = conversation or []
+        ws_manager.publish(
+            test_run_id,
             {
                 "type": "start",
                 "persona": {
-                    "id": persona.id,
-                    "full_name": persona.full_name,
-                    "debt_amount": float(persona.debt_amount),
-                    "due_date": persona.due_date.isoformat(),
+                    "id": persona_dict["id"],
+                    "full_name": persona_dict["full_name"],
+                    "debt_amount": persona_dict["amount_due"],
+                    "due_date": persona_dict["due_date"],
                 },
             },
         )
 
         for _ in range(max(1, iterations)):
             try:
-                a_msg = llm.agent_reply(persona_dict, history)
+                a_msg = await llm.agent_reply(agent_persona, history)
             except Exception as e:
-                await ws_manager.broadcast(
-                    test_run.id, {"type": "error", "message": f"Agent LLM error: {e}"}
+                ws_manager.publish(
+                    test_run_id, {"type": "error", "message": f"Agent LLM error: {e}"}
                 )
                 break
 
-            a_entry = {
-                "role": "agent",
-                "content": a_msg,
-            }
-
-            history = await _update_conversation_history(db, test_run, {"agent": a_msg})
-            await ws_manager.broadcast(test_run.id, {"type": "message", **a_entry})
+            # Persist and broadcast the agent's and persona's messages together
+            # once the turn completes
+            history = history + [{"agent": a_msg}]
 
             try:
-                p_msg = llm.persona_reply(persona_dict, history)
+                p_msg = await llm.persona_reply(persona_dict, history)
             except Exception as e:
-                await ws_manager.broadcast(
-                    test_run.id, {"type": "error", "message": f"Persona LLM error: {e}"}
+                await _update_conversation_history(
+                    db, test_run_id, len(history) - 1, [{"agent": a_msg}]
+                )
+                ws_manager.publish(
+                    test_run_id, {"type": "message", "role": "agent", "content": a_msg}
+                )
+                ws_manager.publish(
+                    test_run_id, {"type": "error", "message": f"Persona LLM error: {e}"}
                 )
                 break
 
-            p_entry = {
-                "role": "persona",
-                "content": p_msg,
-            }
-
-            history = await _update_conversation_history(
-                db, test_run, {"persona": p_msg}
+            history = history + [{"persona": p_msg}]
+            await _update_conversation_history(
+                db, test_run_id, len(history) - 2, [{"agent": a_msg}, {"persona": p_msg}]
+            )
+            ws_manager.publish(
+                test_run_id,
+                _TURN_FRAME.format(
+                    agent=orjson.dumps(a_msg).decode(),
+                    persona=orjson.dumps(p_msg).decode(),
+                ),
             )
-            await ws_manager.broadcast(test_run.id, {"type": "message", **p_entry})
-
-            await asyncio.sleep(0.1)
 
         try:
-            metric, feedback, status = llm.validate_conversation(history)
+            metric, feedback, status = await llm.validate_conversation(history)
         except Exception as e:
-            await ws_manager.broadcast(
-                test_run.id, {"type": "error", "message": f"Validator LLM error: {e}"}
+            ws_manager.publish(
+                test_run_id, {"type": "error", "message": f"Validator LLM error: {e}"}
             )
             metric, feedback, status = None, None, "failed"
 
-        test_run.metric = metric
-        test_run.feedback = feedback
-        test_run.status = status
+        # A bulk UPDATE skips the ORM events, so mirror the metric columns here
+        await db.execute(
+            update(TestRun)
+            .where(TestRun.id == test_run_id)
+            .values(
+                metric=metric,
+                feedback=feedback,
+                status=status,
+                politeness=(metric or {}).get("politeness"),
+                negotiation_level=(metric or {}).get("negotiation_level"),
+            )
+            .execution_options(synchronize_session=False)
+        )
         await db.commit()
 
-        await ws_manager.broadcast(
-            test_run.id,
+        ws_manager.publish(
+            test_run_id,
             {
                 "type": "end",
                 "metric": metric,
@@ -129,6 +129,17 @@ export default function LiveTesting() {
               }]);
               break;
 
+            case 'turn':
+              setMessages(prev => [
+                ...prev,
+                ...data.messages.map((message: { role: string; content: string }) => ({
+                  role: message.role,
+                  content: message.content,
+                  timestamp: Date.now()
+                }))
+              ]);
+              break;
+
             case 'end':
               setTestResults({
                 metric: data.metric,